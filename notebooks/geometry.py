@@ -0,0 +1,139 @@
+# Edge geometry for drawing graphs, worked out for every edge at once. Points are passed as (m, 2) arrays with a row
+# per edge, and circles are intersected exactly rather than by approximating them with polygons
+
+# 3rd Party
+import numpy as np
+
+
+def segment_circle_hits(a, b, centres, radii):
+    """
+    Intersects segments from a to b with circles, returning the segment parameter (0 at a, 1 at b) of up to two crossings of each.
+    Parameters are NaN where a segment has no crossing.
+    a, b, centres: arrays of points, of the same shape
+    radii: an array of radii, of the shape of a without its last axis
+    """
+    d = b - a
+    f = a - centres
+    qa = (d ** 2).sum(axis=-1)
+    qb = 2 * (f * d).sum(axis=-1)
+    qc = (f ** 2).sum(axis=-1) - radii ** 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.sqrt(qb ** 2 - 4 * qa * qc)
+        first = (-qb - root) / (2 * qa)
+        second = (-qb + root) / (2 * qa)
+
+    first[(first < 0) | (first > 1)] = np.nan
+    second[(second < 0) | (second > 1) | (second == first)] = np.nan
+    return first, second
+
+
+def edge_offsets(starts, ends, node_sizes):
+    """
+    Where to end straight edges so that they stop short of the symbol of the node they point to: the point where each edge crosses a circle 8 larger than the node around its end.
+    Edges that start inside the circle end at the centre of the node.
+    starts, ends: (m, 2) arrays of the coordinates of the edges' sources and targets
+    node_sizes: the sizes of the target nodes
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    radii = np.trunc(np.asarray(node_sizes, dtype=float)) + 8
+
+    vector = starts - ends
+    length = np.sqrt((vector ** 2).sum(axis=1))
+    outside = length >= radii
+
+    offsets = ends.copy()
+    offsets[outside] += vector[outside] * (radii[outside] / length[outside])[:, None]
+    return offsets
+
+
+def circle_intersections(starts, ends, multiplier=0.6):
+    """
+    The two points where circles around the start and end of each edge cross, each circle's radius being the edge's length times multiplier.
+    Returns two (m, 2) arrays, ordered by x and then by y, or the start and end themselves for edges of no length.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+
+    vector = ends - starts
+    length = np.sqrt((vector ** 2).sum(axis=1))
+    middle = (starts + ends) / 2
+
+    # The crossings are either side of the middle of the edge, at right angles to it
+    height = length * np.sqrt(max(multiplier ** 2 - 0.25, 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normal = np.stack([-vector[:, 1], vector[:, 0]], axis=1) / length[:, None]
+    first = middle + normal * height[:, None]
+    second = middle - normal * height[:, None]
+
+    swap = (second[:, 0] < first[:, 0]) | ((second[:, 0] == first[:, 0]) & (second[:, 1] < first[:, 1]))
+    first[swap], second[swap] = second[swap], first[swap].copy()
+
+    empty = length == 0
+    first[empty] = starts[empty]
+    second[empty] = ends[empty]
+    return first, second
+
+
+def control_points(starts, ends):
+    """
+    The control points for curved edges: one of the circle_intersections() of each edge, chosen by the direction the edge runs in so that curves bow consistently.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    first, second = circle_intersections(starts, ends)
+    return np.where((starts[:, 0] > np.asarray(ends, dtype=float).reshape(-1, 2)[:, 0])[:, None], first, second)
+
+
+def curve_points(starts, controls, ends, samples=20):
+    """Points along the quadratic Bezier curves from starts to ends, as an (m, samples, 2) array"""
+    t = np.linspace(0, 1, samples)[None, :, None]
+    return ((1 - t) ** 2) * starts[:, None, :] + (2 * t * (1 - t)) * controls[:, None, :] + (t ** 2) * ends[:, None, :]
+
+
+def curve_offsets(starts, controls, ends, node_sizes, samples=20, block=1024):
+    """
+    Where curved edges cross a circle the size of the node they point to, for placing arrowheads.
+    Curves are followed through the same 20 points that they have always been sampled at, so arrowheads sit where they did before.
+    Returns an (m, 2) array, with NaN for curves that don't cross the circle exactly once (usually because the nodes are too close together), which shouldn't be given arrowheads.
+    block: how many edges to work on at a time, which keeps the memory used down on large graphs
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    controls = np.asarray(controls, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    radii = np.asarray(node_sizes, dtype=float).reshape(-1)
+
+    offsets = np.full((len(starts), 2), np.nan)
+    for first_edge in range(0, len(starts), block):
+        edges = slice(first_edge, first_edge + block)
+        points = curve_points(starts[edges], controls[edges], ends[edges], samples)
+        a = points[:, :-1]
+        b = points[:, 1:]
+        centres = np.broadcast_to(ends[edges][:, None, :], a.shape)
+        first, second = segment_circle_hits(a, b, centres, np.broadcast_to(radii[edges][:, None], a.shape[:2]))
+
+        # A crossing at the very end of one segment is the same crossing as at the start of the next
+        first[:, 1:][first[:, 1:] == 0] = np.nan
+        second[:, 1:][second[:, 1:] == 0] = np.nan
+        hits = np.stack([first, second], axis=2).reshape(len(a), -1)
+
+        found = ~np.isnan(hits)
+        rows = np.nonzero(found.sum(axis=1) == 1)[0]
+        if len(rows) > 0:
+            column = found[rows].argmax(axis=1)
+            t = hits[rows, column][:, None]
+            segment = column // 2
+            offsets[first_edge + rows] = a[rows, segment] + t * (b[rows, segment] - a[rows, segment])
+    return offsets
+
+
+def arrowheads(starts, tips, r):
+    """
+    The triangles for arrowheads pointing from starts to tips, as an (m, 3, 2) array
+    r: the distance from each tip to the other corners of its triangle
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    tips = np.asarray(tips, dtype=float).reshape(-1, 2)
+    angle = np.arctan2(tips[:, 1] - starts[:, 1], tips[:, 0] - starts[:, 0])
+    angles = angle[:, None] + np.array([0, 2 * np.pi / 3, 4 * np.pi / 3])[None, :]
+    return np.stack([r * np.cos(angles) + tips[:, 0, None], r * np.sin(angles) + tips[:, 1, None]], axis=2)
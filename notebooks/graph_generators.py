@@ -1,22 +1,169 @@
 # Python Core
 from lxml import etree
+import bisect
 import networkx as nx
 import pprint
 import json
-from io import StringIO
-
-# 3rd Party
-from bs4 import BeautifulSoup, element
+import os
+import hashlib
+import inspect
+import time
+import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.sax import make_parser, SAXParseException
+from xml.sax.handler import ContentHandler
+from xml.sax.saxutils import escape
 
 # This library
+import graph_writers
+import layouts
+import parsefile
+from parsefile import ParsedDocument, Topos, Connection, Toporef
 from svg_generators import GraphToSvg
 from styles import colour_style, print_style
 
 
+class ValidationResult:
+    """
+    The problems found in a Chrono-carto encoded XML file, by CCXMLValidator.check_xml or validate_files.
+    Each problem is a dictionary with the element's tag, its line in the file, a message and the element's attributes, and a group: 'nodes', 'connections' or 'toporefs' for errors and warnings, and 'sources' or 'targets' for mismatches.
+    """
+
+    def __init__(self, file=None):
+        """
+        file: the name of the file checked, if there is one
+        """
+        self.file = file
+        # Missing attributes, and anything else that stops graphs being made from the file
+        self.errors = []
+        # Attribute values that aren't in the schema's vocabulary, usually typos
+        self.warnings = []
+        # Connections to or from topoi that don't exist
+        self.mismatches = []
+
+    def add(self, problems, group, tag, line, message, attrib):
+        problems.append({'group': group, 'element': tag, 'line': line, 'message': message, 'attributes': dict(attrib)})
+
+    @property
+    def ok(self):
+        """Whether the file has no errors or mismatches. Attribute typos don't count, as they don't stop graphs being made"""
+        return len(self.errors) == 0 and len(self.mismatches) == 0
+
+    def to_dict(self):
+        return {'file': self.file, 'ok': self.ok, 'errors': self.errors, 'warnings': self.warnings, 'mismatches': self.mismatches}
+
+    def to_json(self, **kwargs):
+        """The result as JSON. kwargs are passed on to json.dumps"""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def message(self):
+        """A summary of the problems, for reading"""
+
+        def grouped(problems, groups):
+            for problem in problems:
+                if problem['group'] not in groups:
+                    groups = groups + [problem['group']]
+            return {group: [[problem['message'], problem['attributes']] for problem in problems if problem['group'] == group] for group in groups}
+
+        message = 'Errors:\n'
+
+        if len(self.errors) > 0:
+            message += pprint.pformat(grouped(self.errors, ['nodes', 'connections', 'toporefs']))
+        else:
+            message += 'No errors found!\n'
+
+        message += 'Attribute typos:\n'
+
+        if len(self.warnings) > 0:
+            message += pprint.pformat(grouped(self.warnings, ['nodes', 'connections', 'toporefs']))
+        else:
+            message += 'No attribute typos found!\n'
+
+        message += 'Source and Target mis-matches:\n'
+
+        if len(self.mismatches) > 0:
+            message += pprint.pformat(grouped(self.mismatches, ['sources', 'targets']))
+        else:
+            message += 'No mismatches found!\n'
+
+        return message
+
+    def __str__(self):
+        return self.message()
+
+
+class CCChecks:
+    """
+    The checks made by CCXMLValidator.check_xml, fed one element at a time, so that they can be made while walking a parsed tree or while a file is being parsed.
+    Topos framenames are kept in a set as they are found, and connections' sources and targets are looked up in it once the whole file has been seen.
+    """
+
+    def __init__(self, chronotopes, connections, file=None):
+        """
+        chronotopes: the allowed topos types
+        connections: the allowed connection and toporef relations
+        file: the name of the file being checked, for the result
+        """
+        self.chronotopes = set(chronotopes)
+        self.connections = set(connections)
+        self.result = ValidationResult(file)
+        self.framenames = set()
+        # The connections' sources and targets, with their lines and attributes, checked in finish()
+        self.ends = []
+
+    def check_element(self, tag, attrib, line):
+        """
+        Checks an element, if it is a topos, connection or toporef
+        attrib: the element's attributes, as a dictionary
+        line: the line the element is on
+        """
+        result = self.result
+
+        if tag == 'topos':
+            if 'type' not in attrib:
+                result.add(result.errors, 'nodes', tag, line, 'No type attribute on line ' + str(line), attrib)
+            elif attrib['type'] not in self.chronotopes:
+                result.add(result.warnings, 'nodes', tag, line, 'Check node type attribute on line ' + str(line), attrib)
+            if 'framename' not in attrib:
+                result.add(result.errors, 'nodes', tag, line, 'No framename attribute on line ' + str(line), attrib)
+            else:
+                self.framenames.add(attrib['framename'])
+
+        elif tag == 'connection':
+            if 'source' not in attrib:
+                result.add(result.errors, 'connections', tag, line, 'No source attribute on line ' + str(line), attrib)
+            if 'target' not in attrib:
+                result.add(result.errors, 'connections', tag, line, 'No target attribute on line ' + str(line), attrib)
+            if 'relation' not in attrib:
+                result.add(result.errors, 'connections', tag, line, 'No relation attribute on line ' + str(line), attrib)
+            elif attrib['relation'] not in self.connections:
+                result.add(result.warnings, 'connections', tag, line, 'Check relation attribute on line ' + str(line), attrib)
+            self.ends.append((attrib.get('source'), attrib.get('target'), line, dict(attrib)))
+
+        elif tag == 'toporef':
+            if 'role' not in attrib:
+                result.add(result.errors, 'toporefs', tag, line, 'No role attribute on line ' + str(line), attrib)
+            if 'relation' not in attrib:
+                result.add(result.errors, 'toporefs', tag, line, 'No relation attribute on line ' + str(line), attrib)
+            elif attrib['relation'] not in self.connections:
+                result.add(result.warnings, 'toporefs', tag, line, 'Check relation attribute on line ' + str(line), attrib)
+
+    def finish(self):
+        """Checks the connections' sources and targets against the topoi, and returns the ValidationResult"""
+        result = self.result
+        for end, group in [(0, 'sources'), (1, 'targets')]:
+            for connection in self.ends:
+                name = connection[end]
+                if name is not None and name not in self.framenames:
+                    result.add(result.mismatches, group, 'connection', connection[2], 'No matching topos for ' + group[:-1] + ' attribute "' + name + '" on line ' + str(connection[2]), connection[3])
+        return result
+
+
 class CCXMLValidator:
     """Checks a Chrono-carto encoded XML file for errors"""
     
     xml_element = None
+    file = None
     
     chronotopes = [
         'anti-idyll',
@@ -46,231 +193,342 @@ class CCXMLValidator:
         'metaphor'
     ]
     
-    # An experimental DTD for the CC schema - can be used with check_against_dtd, below. DTD enumerated values do not permit whitespace, therefore the schema defined here is slightly different to schema in use, hence its designation 'experimental'.
-    dtd_str = """
-    <!ELEMENT document ANY>
-    <!ELEMENT topos (#PCDATA)>
-    <!ATTLIST topos type 
-        (encounter|
-        road|
-        castle|
-        idyll|
-        wilderness|
-        anti-idyll|
-        threshold|
-        parlour|
-        town|
-        square|
-        distortion|
-        metanarrative)
-    #REQUIRED>
-    <!ATTLIST topos framename CDATA #REQUIRED>
-
-    <!ELEMENT connection (#PCDATA)>
-    <!ATTLIST connection relation
-        (direct | 
-        indirect |
-        projection | 
-        interrupt | 
-        jump | 
-        intratextual | 
-        paratextual | 
-        metatextual)
-    #REQUIRED>
-    <!ATTLIST connection source CDATA #REQUIRED>
-    <!ATTLIST connection target CDATA #REQUIRED>
-
-    <!ELEMENT toporef (#PCDATA)>
-    <!ATTLIST toporef role
-        (active | 
-        passive | 
-        metaphor | 
-        alt | 
-        act)
-    #REQUIRED>
-    <!ATTLIST toporef relation
-        (direct | 
-        indirect |
-        projection | 
-        jump)
-    #IMPLIED>
-    """
+    # The roles a toporef can play in its topos
+    roles = [
+        'active',
+        'passive',
+        'metaphor',
+        'alt',
+        'act'
+    ]
     
     def __init__(self, file):
         tree = etree.parse(file)
         self.xml_element = tree.getroot()
+        self.file = file if isinstance(file, str) else None
     
-    def check_xml(self):
+    def check_xml(self, verbose=True):
         """
-        Checks for the most common problems with a Chrono-Carto-encoded XML file. 
+        Checks for the most common problems with a Chrono-Carto-encoded XML file, in one pass over the XML.
+        Returns a ValidationResult, with the errors, attribute typos and source/target mismatches found and the lines they are on.
+        verbose: print a summary of the problems found, as well as returning them
         WARNING: this doesn't pick up inconsistencies in the naming of topoi, source and target tags
         """
+        checks = CCChecks(self.chronotopes, self.connections, self.file)
+        for element in self.xml_element.iter('topos', 'connection', 'toporef'):
+            checks.check_element(element.tag, element.attrib, element.sourceline)
+        result = checks.finish()
 
-        xml_element = self.xml_element
-        chronotopes = self.chronotopes
-        connections = self.connections
-
-        errors = {'nodes': [], 'connections': [], 'toporefs': []}
+        if verbose:
+            print(result.message())
+        return result
 
-        warnings = {'nodes': [], 'connections': [], 'toporefs': []}
-
-        sources_and_targets = {'sources': [], 'targets': []}
-
-        nodes = []
-        
-        message = ''
-
-        for topos in xml_element.iter('topos'):
-            try:
-                topos.attrib['type']
-                if topos.attrib['type'] not in chronotopes:
-                    warnings['nodes'].append(['Check node type attribute on line ' + str(topos.sourceline), topos.attrib])
-            except:
-                errors['nodes'].append(['No type attribute on line ' + str(topos.sourceline), topos.attrib])
-            try:
-                topos.attrib['framename']
-                nodes.append(topos.attrib['framename'])
-            except:
-                errors['nodes'].append(['No framename attribute on line ' + str(topos.sourceline), topos.attrib])
-
-
-        for connection in xml_element.iter('connection'):
-            try:
-                connection.attrib['source']
-            except:
-                errors['connections'].append(['No source attribute on line ' + str(connection.sourceline), connection.attrib])
-            try:
-                connection.attrib['target']
-            except:
-                errors['connections'].append(['No target attribute on line ' + str(connection.sourceline), connection.attrib])
-            try:
-                connection.attrib['relation']
-                if connection.attrib['relation'] not in connections:
-                    warnings['connections'].append(['Check relation attribute on line ' + str(connection.sourceline), connection.attrib])
-            except:
-                errors['connections'].append(['No relation attribute on line ' + str(connection.sourceline), connection.attrib])
-
-
-        for connection in xml_element.iter('connection'):
-            try:
-                if connection.attrib['source'] not in nodes:
-                    sources_and_targets['sources'].append(['No matching topos for source attribute "' + connection.attrib['source'] + '" on line ' + str(connection.sourceline), connection.attrib])
-                if connection.attrib['target'] not in nodes:
-                    sources_and_targets['targets'].append(['No matching topos for target attribute "' + connection.attrib['target'] + '" on line ' + str(connection.sourceline), connection.attrib])
-            except:
-                print(connection.sourceline, connection.attrib)
+    def check_against_schema(self, verbose=True):
+        """
+        Validates the XML against the compiled RelaxNG schema (see relaxng_schema), which libxml2 checks natively. Unlike check_xml, unknown attribute values are errors rather than typos, and toporef roles are checked too.
+        Returns a ValidationResult, with the schema's errors in the group 'schema'.
+        verbose: print a summary of the problems found, as well as returning them
+        """
+        result = ValidationResult(self.file)
+        if not cc_schema.validate(self.xml_element):
+            for error in cc_schema.error_log:
+                result.add(result.errors, 'schema', None, error.line, error.message + ' on line ' + str(error.line), {})
+
+        if verbose:
+            print(result.message())
+        return result
+
+    def check_against_dtd(self, dtd_str=None):
+        """Kept for older notebooks: the experimental DTD this used couldn't express values with whitespace in them, like 'public square', so this now checks against the schema. Returns True if the XML is valid, or prints the first error."""
+        result = self.check_against_schema(verbose=False)
+        if result.ok:
+            return True
+        else:
+            print(result.errors[0]['message'])
 
 
-        for toporef in xml_element.iter('toporef'):
-            try:
-                toporef.attrib['role']
-            except:
-                errors['toporefs'].append(['No role attribute on line ' + str(toporef.sourceline), toporef.attrib])
-            try:
-                toporef.attrib['relation']
-                if toporef.attrib['relation'] not in connections:
-                    warnings['toporefs'].append(['Check relation attribute on line ' + str(toporef.sourceline), toporef.attrib])
-            except:
-                errors['toporefs'].append(['No relation attribute on line ' + str(toporef.sourceline), toporef.attrib])
+def relaxng_schema(chronotopes, connections, roles):
+    """
+    A RelaxNG schema for Chrono-carto encoded XML, as a string. topos, connection and toporef elements must have the attributes check_xml looks for, with values from the given vocabularies, and can have others. Any other elements can appear around and inside them.
+    chronotopes: the allowed topos types
+    connections: the allowed connection and toporef relations
+    roles: the allowed toporef roles
+    """
 
-        message += 'Errors:\n'
-        
-        if (len(errors['connections']) > 0) or (len(errors['nodes']) > 0) or (len(errors['toporefs']) > 0):
-            message += pprint.pformat(errors)
-        else:
-            message += 'No errors found!\n'
-        
-        message += 'Attribute typos:\n'
-        
-        if (len(warnings['connections']) > 0) or (len(warnings['nodes']) > 0) or (len(warnings['toporefs']) > 0):
-            message += pprint.pformat(warnings)
-        else:
-            message += 'No attribute typos found!\n'
+    def values(vocabulary):
+        return '<choice>' + ''.join('<value type="string">' + escape(value) + '</value>' for value in vocabulary) + '</choice>'
+
+    def other_attributes(*names):
+        return '<zeroOrMore><attribute><anyName><except>' + ''.join('<name>' + name + '</name>' for name in names) + '</except></anyName></attribute></zeroOrMore>'
+
+    return """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+        <start><ref name="element"/></start>
+        <define name="content">
+            <mixed><zeroOrMore><ref name="element"/></zeroOrMore></mixed>
+        </define>
+        <define name="element">
+            <choice>
+                <element name="topos">
+                    <attribute name="type">""" + values(chronotopes) + """</attribute>
+                    <attribute name="framename"/>
+                    """ + other_attributes('type', 'framename') + """
+                    <ref name="content"/>
+                </element>
+                <element name="connection">
+                    <attribute name="source"/>
+                    <attribute name="target"/>
+                    <attribute name="relation">""" + values(connections) + """</attribute>
+                    """ + other_attributes('source', 'target', 'relation') + """
+                    <ref name="content"/>
+                </element>
+                <element name="toporef">
+                    <attribute name="role">""" + values(roles) + """</attribute>
+                    <attribute name="relation">""" + values(connections) + """</attribute>
+                    """ + other_attributes('role', 'relation') + """
+                    <ref name="content"/>
+                </element>
+                <element>
+                    <anyName><except><name>topos</name><name>connection</name><name>toporef</name></except></anyName>
+                    <zeroOrMore><attribute><anyName/></attribute></zeroOrMore>
+                    <ref name="content"/>
+                </element>
+            </choice>
+        </define>
+    </grammar>"""
+
+
+# The schema is compiled once, when the module is loaded, rather than for every file checked
+cc_schema = etree.RelaxNG(etree.fromstring(relaxng_schema(CCXMLValidator.chronotopes, CCXMLValidator.connections, CCXMLValidator.roles)))
+
+
+class CCContentHandler(ContentHandler):
+    """A SAX handler that makes the CCXMLValidator checks as the file is parsed, so one parse checks both that the XML is well-formed and that it follows the schema"""
+
+    def __init__(self, checks):
+        ContentHandler.__init__(self)
+        self.checks = checks
+
+    def startElement(self, name, attrs):
+        self.checks.check_element(name, dict(attrs), self._locator.getLineNumber())
+
+
+def validate_file(file, chronotopes=None, connections=None):
+    """
+    Checks that an XML file is well-formed and follows the Chrono-carto schema, in a single SAX parse.
+    Returns the ValidationResult as a dictionary (see ValidationResult.to_dict), with whether the file is well-formed, the syntax error if it isn't, and the time taken.
+    chronotopes, connections: the allowed topos types and relations, defaulting to CCXMLValidator's
+    """
+    start = time.time()
+    if chronotopes is None:
+        chronotopes = CCXMLValidator.chronotopes
+    if connections is None:
+        connections = CCXMLValidator.connections
+
+    checks = CCChecks(chronotopes, connections, file)
+    parser = make_parser()
+    parser.setContentHandler(CCContentHandler(checks))
+
+    syntax_error = None
+    try:
+        parser.parse(file)
+    except SAXParseException as e:
+        syntax_error = {'message': e.getMessage(), 'line': e.getLineNumber(), 'column': e.getColumnNumber()}
+    except Exception as e:
+        syntax_error = {'message': repr(e), 'line': None, 'column': None}
+
+    result = checks.finish().to_dict()
+    result['well_formed'] = syntax_error is None
+    result['syntax_error'] = syntax_error
+    result['ok'] = result['ok'] and syntax_error is None
+    result['seconds'] = time.time() - start
+    return result
+
+
+def validate_corpus(files, workers=None, fail_fast=False, report_file=None):
+    """
+    Validates many XML files at once, spreading them over a pool of processes. Each file is parsed once, checking both that it is well-formed and that it follows the schema (see validate_file).
+    files: a directory, whose .xml files are all validated, a glob pattern such as 'files/xml/*.xml', or a list of paths
+    workers: the number of processes to use - defaults to the number of CPUs. With 1, the files are validated in this process.
+    fail_fast: stop at the first file that isn't well-formed or has errors or mismatches, rather than validating them all
+    report_file: path to write the report to, as JSON
+    Returns the report: the files that passed and failed, and each file's result.
+    """
+    start = time.time()
 
-        message += 'Source and Target mis-matches:\n'
-        
-        if (len(sources_and_targets['sources']) > 0) or (len(sources_and_targets['targets']) > 0):
-            message += pprint.pformat(sources_and_targets)
-        else:
-            message += 'No mismatches found!\n'
-        
-        print(message)
-        
-    def check_against_dtd(self, dtd_str):
-        """This works, but the DTD doesn't actually reflect the schema in use, as our attribute values include whitespace, which aren't valid in DTD enumerated values."""
-        f = StringIO(dtd_str)
-        dtd = etree.DTD(f)
-        if dtd.validate(self.xml_element) == True:
-            return True
+    if isinstance(files, str):
+        if os.path.isdir(files):
+            files = sorted(os.path.join(files, f) for f in os.listdir(files) if f.endswith('.xml'))
         else:
-            print(dtd.error_log.filter_from_errors()[0])
-        
-
+            files = sorted(glob.glob(files))
+    files = list(files)
+
+    results = {}
+    stopped = False
+
+    if workers == 1:
+        for file in files:
+            results[file] = validate_file(file)
+            if fail_fast and not results[file]['ok']:
+                stopped = True
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(validate_file, file): file for file in files}
+            for future in as_completed(futures):
+                result = future.result()
+                results[result['file']] = result
+                if fail_fast and not result['ok']:
+                    stopped = True
+                    for waiting in futures:
+                        waiting.cancel()
+                    break
+
+    # Results in the order the files were given, whichever order they finished in
+    results = [results[file] for file in files if file in results]
+
+    report = {
+        'files': len(files),
+        'checked': len(results),
+        'passed': [result['file'] for result in results if result['ok']],
+        'failed': [result['file'] for result in results if not result['ok']],
+        'not_well_formed': [result['file'] for result in results if not result['well_formed']],
+        'errors': sum(len(result['errors']) for result in results),
+        'warnings': sum(len(result['warnings']) for result in results),
+        'mismatches': sum(len(result['mismatches']) for result in results),
+        'stopped_early': stopped,
+        'seconds': time.time() - start,
+        'results': results
+    }
+
+    if report_file is not None:
+        with open(report_file, 'w') as file:
+            file.write(json.dumps(report, indent = 4))
+
+    print('Validated ' + str(len(results)) + ' of ' + str(len(files)) + ' files in ' + str(round(report['seconds'], 1)) + ' seconds: ' + str(len(report['passed'])) + ' passed, ' + str(len(report['failed'])) + ' failed')
+    if stopped:
+        print('Stopped at the first failure: ' + report['failed'][0])
+
+    return report
 
 
 class GraphGenerator():
     """Base class for all other CC graph generation classes"""
     
     graph = None
+    document = None
     xml_element = None
     xml_dir = None
     output_root = None
     output_dir = None
     output_file = None
+    output_suffix = ''
     file = None
     
-    def __init__(self, file, xml_dir='files/xml/', output_dir='files/graphs/', output_root=None, svg_dir='files/svg/'):
+    def __init__(self, file=None, xml_dir='files/xml/', output_dir='files/graphs/', output_root=None, svg_dir='files/svg/', document=None, stream=False):
         """
         Parses the XML, creates an empty graph, and prepares the output directories and files.
+        document: a ParsedDocument to share between generators, in which case the XML isn't parsed again
+        stream: parse the XML incrementally, without keeping the tree in memory - for very large files
         """
         # Load the XML. If a file-like object has been passed rather than a path to a file, then the output_root property will not be generated from the file name, so needs to be set using the output_root parameter.
-        try:
-            tree = etree.parse(xml_dir + file)
-        except:
-            tree = etree.parse(file)
+        if document is None:
+            document = ParsedDocument(file, xml_dir=xml_dir, stream=stream)
+        
+        if file is None:
+            file = document.file
         
         if output_root != None:
             self.output_root = output_root
         else:
             self.output_root = file[:-4]
             
-        self.xml_element = tree.getroot()
+        self.document = document
+        self.xml_element = document.xml_element
         self.graph = nx.DiGraph()
         self.output_dir = output_dir
         self.xml_dir = xml_dir
         self.svg_dir = svg_dir
         self.file = file
     
-    def layout(self, algorithm='kamada', scale=10):
-        """Lay out the graph using networkx's built in algorithms"""
-        if algorithm == 'kamada':
-            pos = nx.kamada_kawai_layout(self.graph, center=[0,0], scale=scale)
-        elif algorithm == 'spring':
-            pos = nx.spring_layout(self.graph, center=[0,0], scale=scale, iterations=100)
-        elif algorithm == 'spectral':
-            pos = nx.spectral_layout(self.graph, center=[0,0], scale=scale)
+    def layout(self, algorithm='kamada', scale=10, cache=None, incremental=False, previous=None):
+        """
+        Lay out the graph using networkx's built in algorithms, or with 'force', a NumPy force-directed layout for large graphs
+        cache: a LayoutCache, so that graphs with the same nodes and edges aren't laid out again, or False to always lay the graph out afresh. Defaults to the shared layouts.layout_cache.
+        incremental: if the graph has changed since it was last laid out, keep the earlier positions and only place the new nodes. The earlier layout is the latest one in the cache for this graph's output file, or previous.
+        previous: earlier positions, as a dictionary of nodes to (x, y) in the graph's 'x' and 'y' units, or the path to a GraphML or GEXF file with positions, e.g. from Gephi. Implies incremental.
+        """
+        if cache is None:
+            cache = layouts.layout_cache
+        
+        label = self.output_root + self.output_suffix + '-' + algorithm + '-' + str(scale)
+        
+        pos = None
+        if cache:
+            key = cache.key(self.graph, algorithm, scale)
+            pos = cache.get(key)
         
-        for node, coords in pos.items():
+        if pos is None:
+            # Positions are stored in the graph multiplied by 100, so earlier positions are scaled back to the layout's units
+            if isinstance(previous, str):
+                previous = layouts.read_positions(previous)
+            if previous is not None:
+                previous = {node: (coords[0] / 100, coords[1] / 100) for node, coords in previous.items()}
+            elif incremental and cache:
+                previous = cache.latest(label)
+
+            # Earlier positions that share no nodes with the graph are no help, so it is laid out afresh with the algorithm and scale asked for
+            if previous is not None and not any(node in previous or str(node) in previous for node in self.graph.nodes):
+                previous = None
+
+            if previous is not None:
+                pos = layouts.incremental_layout(self.graph, previous)
+            elif algorithm == 'kamada':
+                pos = nx.kamada_kawai_layout(self.graph, center=[0,0], scale=scale)
+            elif algorithm == 'spring':
+                pos = nx.spring_layout(self.graph, center=[0,0], scale=scale, iterations=100)
+            elif algorithm == 'spectral':
+                pos = nx.spectral_layout(self.graph, center=[0,0], scale=scale)
+            elif algorithm == 'force':
+                pos = layouts.force_layout(self.graph, center=[0,0], scale=scale)
+            
+            if cache:
+                pos = cache.put(key, pos, label=label)
+            else:
+                pos = {str(node): coords for node, coords in pos.items()}
+        
+        for node in self.graph.nodes:
+            coords = pos[str(node)]
             self.graph.nodes[node]['x'] = coords[0] * 100
             self.graph.nodes[node]['y'] = coords[1] * 100
     
-    def write_gexf(self):
-        """Write the graph to gexf"""
-        output_file = self.output_root + self.output_suffix + '.gexf'
-        with open(self.output_dir + output_file, 'w') as output_file:
-            for line in nx.readwrite.gexf.generate_gexf(self.graph):
-                output_file.write(line)
-
-    def write_graphml(self):
-        """Write the graph to graphml"""
-        output_file = self.output_root + self.output_suffix + '.graphml'
-        with open(self.output_dir + output_file, 'w') as output_file:
-            for line in nx.readwrite.graphml.generate_graphml(self.graph):
-                output_file.write(line)
-                
-    def write_json(self):
-        """Write the graph to json"""
-        pass
+    def write_gexf(self, compress=False):
+        """
+        Write the graph to gexf
+        compress: gzip the file, adding '.gz' to its name
+        """
+        output_file = self.output_root + self.output_suffix + '.gexf' + ('.gz' if compress else '')
+        return graph_writers.write_gexf(self.graph, self.output_dir + output_file, compress)
+
+    def write_graphml(self, compress=False):
+        """
+        Write the graph to graphml
+        compress: gzip the file, adding '.gz' to its name
+        """
+        output_file = self.output_root + self.output_suffix + '.graphml' + ('.gz' if compress else '')
+        return graph_writers.write_graphml(self.graph, self.output_dir + output_file, compress)
+
+    def write_json(self, compress=False):
+        """
+        Write the graph to compact node-link json, for the web viewer (see graph_writers.write_json)
+        compress: gzip the file, adding '.gz' to its name
+        """
+        output_file = self.output_root + self.output_suffix + '.json' + ('.gz' if compress else '')
+        return graph_writers.write_json(self.graph, self.output_dir + output_file, compress)
+
+    def write_npz(self):
+        """Write the graph to a NumPy .npz of coordinate and attribute arrays, for loading large graphs in the web viewer (see graph_writers.write_npz)"""
+        output_file = self.output_root + self.output_suffix + '.npz'
+        return graph_writers.write_npz(self.graph, self.output_dir + output_file)
     
     def write_geojson(self):
         """Write the graph to geojson"""
@@ -331,7 +589,7 @@ class GraphGenerator():
         self.layout(algorithm=algorithm)
         svggen = GraphToSvg(graph=self.graph)
         output_file = self.output_root + self.output_suffix + '.svg'
-        svggen.draw_graph(output_file=self.svg_dir + output_file, style=colour_style, curved=True, node_scale=node_scale, size=size, scale_correction=scale_correction)
+        svggen.draw_graph(output_file=self.svg_dir + output_file, style=colour_style, curved=True, node_scale=node_scale, size=size, scale_correction=scale_correction, backend='stream')
         return 'files/svg/' + output_file
         
         
@@ -339,98 +597,71 @@ class CompleteGraphGenerator(GraphGenerator):
     """A complete spatial graph, containing all toporefs and topoi"""
     
     def generate(self):
+        """
+        Builds the graph from a single pass over the document, collecting the topoi, toporefs, connections and toporef sequences, then adds them to the graph in that order.
+        """
         self.output_suffix = '-complete'
         
         graph = self.graph
-        xml_element = self.xml_element
+        document = self.document
         
-        # Add all the litonyms and topoi as nodes and connections as edges first
-        for toporef in xml_element.iter('toporef'):
-            graph.add_node('"' + toporef.text + '"', node_type='toporef')
-
-        topos_count = 0
-
-        for topos in xml_element.iter('topos'):
-            topos_count_str = str(topos_count)
-            try:
-                framename = topos.attrib['framename']
-                new_length = graph.nodes[framename]['length'] + len(''.join(topos.itertext()).strip())
-                graph.nodes[framename]['length'] = new_length
-                graph.nodes[framename]['timeframes'] = graph.nodes[framename]['timeframes'] + ',' + topos_count_str
-
-            except KeyError:
-                graph.add_node(topos.attrib['framename'], length=len(''.join(topos.itertext()).strip()), chronotope=topos.attrib['type'], node_type="topos", timeframes=topos_count_str)
-
-            topos_count += 1
-
-        for connection in xml_element.iter('connection'):
-            try:
-                graph.add_edge(connection.attrib['source'], connection.attrib['target'], relation=connection.attrib['relation'])
-            except:
-                graph.add_edge(connection.attrib['source'], connection.attrib['target'], relation='none')
-
-        # Connect the toporefs to the containing topoi
-        for toporef in xml_element.iter('toporef'):
-            if ('sequence' in toporef.attrib.keys()):
-                pass
-            else:
-                parent = toporef.getparent()
-                containing_node = None
-                if parent.tag == 'topos':
-                    containing_node = parent.attrib['framename']
-                elif parent.tag == 'connection':
-                    containing_topos = parent.getparent()
-                    try:
-                        containing_node = containing_topos.attrib['framename']
-                    except:
-                        pass
-                try:
-                    graph.add_edge(containing_node, '"' + toporef.text + '"', relation=toporef.attrib['relation'])
-                except:
-                    graph.add_edge(containing_node, '"' + toporef.text + '"', relation='none')
-
-        # Connect the toporef sequences to one another
+        toporefs = []
+        topoi = {}
+        connections = []
+        containments = []
         sequences = {}
-        for toporef in xml_element.iter('toporef'):
-            try:
-                sequence = toporef.attrib['sequence']
-                sequences[sequence] = []
-            except:
-                pass
-
-        for sequence in sequences.keys():
-            for toporef in xml_element.iter('toporef'):
+        
+        topos_count = 0
+        
+        for el in document.elements:
+            if isinstance(el, Toporef):
+                toporefs.append('"' + el.text + '"')
+                
+                # Toporefs in a sequence are connected to one another, rather than to their containing topoi
+                if 'sequence' in el.attrib.keys():
+                    sequences.setdefault(el.attrib['sequence'], []).append(el)
+                else:
+                    containments.append((el.containing_node, '"' + el.text + '"', el.attrib.get('relation', 'none')))
+            
+            elif isinstance(el, Topos):
+                topos_count_str = str(topos_count)
+                framename = el.attrib['framename']
                 try:
-                    sequence = toporef.attrib['sequence']
-                    sequences[sequence].append(toporef)
-                except:
-                    pass
-
+                    topoi[framename]['length'] += el.length
+                    topoi[framename]['timeframes'] += ',' + topos_count_str
+                except KeyError:
+                    topoi[framename] = {'length': el.length, 'chronotope': el.attrib['type'], 'node_type': 'topos', 'timeframes': topos_count_str}
+                
+                topos_count += 1
+            
+            else:
+                connections.append((el.attrib['source'], el.attrib['target'], el.attrib.get('relation', 'none')))
+        
+        # Add all the litonyms and topoi as nodes and connections as edges first
+        for toporef in toporefs:
+            graph.add_node(toporef, node_type='toporef')
+        
+        for framename, attributes in topoi.items():
+            graph.add_node(framename, **attributes)
+        
+        for source, target, relation in connections:
+            graph.add_edge(source, target, relation=relation)
+        
+        # Connect the toporefs to the containing topoi
+        for containing_node, toporef, relation in containments:
+            graph.add_edge(containing_node, toporef, relation=relation)
+        
+        # Connect the toporef sequences to one another, the first toporef in each to its containing topos
         for sequence, toporef_list in sequences.items():
             prev_toporef = None
-
-            for toporef in toporef_list:    
+            
+            for toporef in toporef_list:
                 if prev_toporef == None:
-                    parent = toporef.getparent()
-                    containing_node = None
-                    if parent.tag == 'topos':
-                        containing_node = parent.attrib['framename']
-                    elif parent.tag == 'connection':
-                        containing_topos = parent.getparent()
-                        try:
-                            containing_node = containing_topos.attrib['framename']
-                        except:
-                            pass
-                    try:
-                        graph.add_edge(containing_node, '"' + toporef.text + '"', relation=toporef.attrib['relation'])
-                    except:
-                        graph.add_edge(containing_node, '"' + toporef.text + '"', relation='none')
-
-                    prev_toporef = toporef
-
+                    graph.add_edge(toporef.containing_node, '"' + toporef.text + '"', relation=toporef.attrib.get('relation', 'none'))
                 else:
                     graph.add_edge('"' + prev_toporef.text + '"', '"' + toporef.text + '"', relation=toporef.attrib['relation'])
-                    prev_toporef = toporef
+                
+                prev_toporef = toporef
 
                     
 class SyuzhetGraphGenerator(GraphGenerator):
@@ -441,12 +672,18 @@ class SyuzhetGraphGenerator(GraphGenerator):
 
         self.output_suffix = '-syuzhet'
         graph = self.graph
-        xml_element = self.xml_element
+        document = self.document
         
         topoi = []
 
-        for topos in xml_element.iter('topos'):
-            topoi.append([topos.attrib['framename'], topos.attrib['type'], len(''.join(topos.itertext()).strip())])
+        for topos in document.topoi:
+            topoi.append([topos.attrib['framename'], topos.attrib['type'], topos.length])
+
+        # Index the connections by source and target, so each pair of topoi is looked up rather than searched for. Where a pair is connected more than once, the last connection in the text wins.
+        connections = {}
+
+        for c in document.connections:
+            connections[(c.attrib['source'], c.attrib['target'])] = c
 
         prev_node = None
 
@@ -460,15 +697,10 @@ class SyuzhetGraphGenerator(GraphGenerator):
                 except KeyError:
                     graph.add_node(t[0], chronotope=t[1], length=t[2])
 
-                connection = None
+                c = connections.get((prev_node, t[0]))
 
-                for c in xml_element.iter('connection'):
-                    if (c.attrib['source'] == prev_node) and (c.attrib['target'] == t[0]):
-                        graph.add_edge(prev_node, t[0], relation=c.attrib['relation'])
-                        connection = [prev_node, t[0], c.attrib['relation']]
-                    else:
-                        #graph.add_edge(prev_node, t[0], relation='none')
-                        connection = [prev_node, t[0], 'none']
+                if c is not None:
+                    graph.add_edge(prev_node, t[0], relation=c.attrib['relation'])
 
                 prev_node = t[0]
 
@@ -481,15 +713,15 @@ class TopoiGraphGenerator(GraphGenerator):
         
         self.output_suffix = '-topoi'
         graph = self.graph
-        xml_element = self.xml_element
+        document = self.document
         
-        for topos in xml_element.iter('topos'):
+        for topos in document.topoi:
             try:
-                graph.nodes[topos.attrib['framename']]['length'] += len(''.join(topos.itertext()).strip())
+                graph.nodes[topos.attrib['framename']]['length'] += topos.length
             except KeyError:
-                graph.add_node(topos.attrib['framename'], chronotope=topos.attrib['type'], length=len(''.join(topos.itertext()).strip()))
+                graph.add_node(topos.attrib['framename'], chronotope=topos.attrib['type'], length=topos.length)
 
-        for c in xml_element.iter('connection'):
+        for c in document.connections:
             try:
                 graph.add_edge(c.attrib['source'], c.attrib['target'], relation=c.attrib['relation'])
             except KeyError:
@@ -505,27 +737,27 @@ class TemporalTopoiGraphGenerator(GraphGenerator):
         
         self.output_suffix = '-temporal-topoi'
         graph = self.graph
-        xml_element = self.xml_element
+        document = self.document
         
         topoi = {}
         connections = []
         index = 0
 
-        for el in xml_element.iter():
-            if el.tag == 'topos':
+        for el in document.elements:
+            if isinstance(el, Topos):
                 if el.attrib['framename'] not in topoi.keys():
                     topoi[el.attrib['framename']] = {}
                     topoi[el.attrib['framename']]['chronotopes'] = [el.attrib['type']]
                     topoi[el.attrib['framename']]['timeframes'] = [str(index)]
-                    topoi[el.attrib['framename']]['text_lengths'] = [str(len(el.text))]
+                    topoi[el.attrib['framename']]['text_lengths'] = [str(el.lead_length)]
                 else:
                     topoi[el.attrib['framename']]['chronotopes'].append(el.attrib['type'])
                     topoi[el.attrib['framename']]['timeframes'].append(str(index))
-                    topoi[el.attrib['framename']]['text_lengths'].append(str(len(el.text)))
+                    topoi[el.attrib['framename']]['text_lengths'].append(str(el.lead_length))
 
 
 
-            if el.tag == 'connection':
+            if isinstance(el, Connection):
                 connection = {}
                 connection['source'] = el.attrib['source']
                 connection['target'] = el.attrib['target']
@@ -552,25 +784,25 @@ class TemporalTopoiGraphGenerator(GraphGenerator):
         """
         self.output_suffix = '-temporal-topoi-simple'
         graph = self.graph
-        xml_element = self.xml_element
+        document = self.document
         
         graph.clear()
         
         topos_count = 0
     
-        for topos in xml_element.iter('topos'):
+        for topos in document.topoi:
             topos_count_string = str(topos_count)
             try:
-                graph.nodes[topos.attrib['framename']]['length'] += len(''.join(topos.itertext()).strip())
+                graph.nodes[topos.attrib['framename']]['length'] += topos.length
                 timeframes = graph.nodes[topos.attrib['framename']]['timeframes'] + ',' + topos_count_string 
                 graph.nodes[topos.attrib['framename']]['timeframes'] = timeframes
             except KeyError:
-                graph.add_node(topos.attrib['framename'], chronotope=topos.attrib['type'], length=len(''.join(topos.itertext()).strip()), timeframes=topos_count_string)
+                graph.add_node(topos.attrib['framename'], chronotope=topos.attrib['type'], length=topos.length, timeframes=topos_count_string)
 
             topos_count += 1
 
 
-        for c in xml_element.iter('connection'):
+        for c in document.connections:
             try:
                 graph.add_edge(c.attrib['source'], c.attrib['target'], relation=c.attrib['relation'])
             except KeyError:
@@ -584,73 +816,105 @@ class TopoiAndArchetypeGraphGenerator(GraphGenerator):
         
         self.output_suffix = '-topoi-and-chronotopic-archetypes'
         graph = self.graph
-        xml_element = self.xml_element
+        document = self.document
         
-        for topos in xml_element.iter('topos'):
+        for topos in document.topoi:
             graph.add_node(topos.attrib['type'], node_type='chronotope')
             graph.add_node(topos.attrib['framename'], node_type='setting')
             graph.add_edge(topos.attrib['type'], topos.attrib['framename'])
 
 
 class DeepChronotopesGraphGenerator(GraphGenerator):
+    def nearest_chronotope(self, index, framename, position, offset):
+        """
+        Returns the chronotope of a topos named framename, relative to a position in the document, or None if there isn't one.
+        index: a dictionary of framenames to lists of (position, chronotope) tuples, in document order
+        offset: -1 for the nearest topos before the position, -2 for the one before that; 1 for the nearest topos after the position, 2 for the one after that
+        """
+        entries = index.get(framename)
+        if entries is None:
+            return None
+
+        i = bisect.bisect_left(entries, (position,))
+        if offset < 0:
+            i += offset
+        else:
+            i += offset - 1
+
+        if i < 0 or i >= len(entries):
+            return None
+        return entries[i][1]
+
     def generate(self):
         """
-        Creates a 'deep' chronotopes map, ie. the distribution of chronotopes across a text, and how they are connected with one another. Uses Beautifulsoup instead of eTree because XML is a nightmare.
+        Creates a 'deep' chronotopes map, ie. the distribution of chronotopes across a text, and how they are connected with one another. 
+        The source and target of each connection are resolved to the nearest topos with that framename, looked up by document position.
         """
         
-        with open(self.xml_dir + self.file) as fp:
-            soup = BeautifulSoup(fp, features="lxml")
-        
         self.output_suffix = '-deep-chronotopes'
         graph = self.graph
+        document = self.document
+        
+        # Index the position and chronotope of every topos by framename
+        index = {}
+        for topos in document.topoi:
+            chronotope = topos.attrib.get('type')
+            if chronotope is not None:
+                index.setdefault(topos.attrib.get('framename'), []).append((topos.position, chronotope))
         
         # Add all the connections first
         edges = []
-        for connection in soup.find_all('connection'):
-            source = connection.get('source')
-            target = connection.get('target')
-            relation = connection.get('relation')
+        for connection in document.connections:
+            source = connection.attrib.get('source')
+            target = connection.attrib.get('target')
+            relation = connection.attrib.get('relation')
+            position = connection.position
 
             source_chronotope = None
             target_chronotope = None
 
-            if (connection.parent.get('framename') == source):
-                source_chronotope = connection.parent.get('type')
+            # The source is the containing topos if it has the same framename, or else the nearest topos before the connection. The target is looked for before the connection only when it differs from the source, and if the two are the same then it is the second nearest topos of that name.
+            if (connection.parent_attrib.get('framename') == source):
+                source_chronotope = connection.parent_attrib.get('type')
 
             else:
-                for el in connection.previous_elements:
-                    if (isinstance(el, element.Tag) == True):
-                        if el.get('framename') == source and source_chronotope is None:
-                            source_chronotope = el.get('type')
-                        elif el.get('framename') == target and target_chronotope is None:
-                            target_chronotope = el.get('type')
-
-            for el in connection.next_elements:
-                if (isinstance(el, element.Tag) == True and el.get('type') is not None):
-                    if el.get('framename') == target and target_chronotope is None:
-                        target_chronotope = el.get('type')
-                    elif el.get('framename') == source and source_chronotope is None:
-                        source_chronotope = el.get('type')
+                source_chronotope = self.nearest_chronotope(index, source, position, -1)
+                if target != source:
+                    target_chronotope = self.nearest_chronotope(index, target, position, -1)
+                elif source_chronotope is not None:
+                    target_chronotope = self.nearest_chronotope(index, target, position, -2)
+
+            # Whatever hasn't been resolved is taken from the nearest topoi after the connection, the target first
+            if target != source:
+                if target_chronotope is None:
+                    target_chronotope = self.nearest_chronotope(index, target, position, 1)
+                if source_chronotope is None:
+                    source_chronotope = self.nearest_chronotope(index, source, position, 1)
+            else:
+                following = 1
+                if target_chronotope is None:
+                    target_chronotope = self.nearest_chronotope(index, target, position, following)
+                    following += 1
+                if source_chronotope is None:
+                    source_chronotope = self.nearest_chronotope(index, source, position, following)
 
             if (source_chronotope != None and target_chronotope != None):
                 edges.append((source_chronotope, target_chronotope, relation))
 
-        edges = list(set(edges))
+        # Remove duplicates, keeping the order in which the edges appear in the text
+        edges = list(dict.fromkeys(edges))
 
         for e in edges:
             graph.add_edge(e[0], e[1], relation=e[2])
 
         # Then iterate over the topoi and calculate the number of characters in each, appending the values to the nodes
         chronotopes = {}
-        for topos in soup.find_all('topos'):
-            chronotope = topos.get('type')
-            try:
-                if chronotope not in chronotopes.keys():
-                    chronotopes[chronotope] = len(topos.get_text())
-                else:
-                    chronotopes[chronotope] += len(topos.get_text())
-            except:
-                pass
+        for topos in document.topoi:
+            chronotope = topos.attrib.get('type')
+            if chronotope not in chronotopes.keys():
+                chronotopes[chronotope] = topos.raw_length
+            else:
+                chronotopes[chronotope] += topos.raw_length
 
         for c, attribs in chronotopes.items():
             graph.nodes[c]['length'] = attribs  
@@ -665,18 +929,18 @@ class ArchetypesAndToporefsGraphGenerator(GraphGenerator):
         
         self.output_suffix = self.output_root + '-topoi-and-chronotopic-archetypes'
         graph = self.graph
-        xml_element = self.xml_element
+        document = self.document
         
         topoi = {}
-        for topos in xml_element.iter('topos'):
+        for topos in document.topoi:
             try: 
                 chronotope = topos.attrib['type']
-                graph.nodes[chronotope]['length'] += len(''.join(topos.itertext()).strip())
+                graph.nodes[chronotope]['length'] += topos.length
             except KeyError:
-                graph.add_node(topos.attrib['type'], length=len(''.join(topos.itertext()).strip()))
+                graph.add_node(topos.attrib['type'], length=topos.length)
             topoi[topos.attrib['framename']] = topos.attrib['type']
 
-        for connection in xml_element.iter('connection'):
+        for connection in document.connections:
             try:
                 source_chronotope = topoi[connection.attrib['source']]
                 target_chronotope = topoi[connection.attrib['target']]
@@ -685,51 +949,235 @@ class ArchetypesAndToporefsGraphGenerator(GraphGenerator):
             except:
                 pass
 
-        for topos in xml_element.iter('topos'):
+        for topos in document.topoi:
             try:
                 chronotope = topos.attrib['type']
-                for toporef in topos.iter('toporef'):
+                for toporef in topos.toporefs:
                     graph.add_edge(chronotope, '"' + toporef.text + '"', relation=toporef.attrib['relation'])
             except:
                 pass
             
 
-def generate_all(xml_dir, output_dir, input_file):
+# The generators run for every file by generate_all and generate_corpus
+all_generators = [
+    CompleteGraphGenerator,
+    SyuzhetGraphGenerator,
+    TopoiGraphGenerator,
+    # TemporalTopoiGraphGenerator,
+    TopoiAndArchetypeGraphGenerator,
+    DeepChronotopesGraphGenerator,
+    ArchetypesAndToporefsGraphGenerator
+]
+
+
+# Bump this when code shared by the generators changes the graphs they write, e.g. in GraphGenerator, so that every graph is rebuilt
+GENERATOR_VERSION = 1
+
+
+def generator_code_hash():
+    """
+    A hash of the code that turns XML into graphs and writes them, so that graphs built by older versions of the generators are rebuilt.
+    Only the generator classes themselves, the parser and the writers are hashed, so changes elsewhere in this module (to the validator or layouts, say) don't rebuild the whole corpus.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(GENERATOR_VERSION).encode('utf-8'))
+    for generator_class in all_generators:
+        digest.update(inspect.getsource(generator_class).encode('utf-8'))
+    for module in (parsefile, graph_writers):
+        with open(module.__file__, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    A record of the graphs built from each XML file, so that unchanged graphs can be skipped when a corpus is rebuilt. 
+    Each graph is keyed on a hash of the XML content, the generator class and its parameters, and the generator code.
+    """
+    
+    path = None
+    entries = None
+    
+    def __init__(self, path):
+        """
+        path: the manifest file, which is created on save if it doesn't exist
+        """
+        self.path = path
+        self.code_hash = generator_code_hash()
+        try:
+            with open(path) as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+    
+    def keys(self, xml_dir, input_file, parameters):
+        """Returns the build key of each generator for a file"""
+        with open(xml_dir + input_file, 'rb') as file:
+            xml_hash = hashlib.sha256(file.read()).hexdigest()
+        
+        keys = {}
+        for generator_class in all_generators:
+            key = json.dumps([xml_hash, generator_class.__name__, parameters, self.code_hash], sort_keys=True)
+            keys[generator_class.__name__] = hashlib.sha256(key.encode()).hexdigest()
+        return keys
+    
+    def stale(self, xml_dir, input_file, parameters):
+        """
+        Returns the keys of the generators whose graphs for a file are missing or out of date, deleting any out of date graphs.
+        """
+        stale = {}
+        entries = self.entries.get(input_file, {})
+        
+        for name, key in self.keys(xml_dir, input_file, parameters).items():
+            entry = entries.get(name)
+            if entry is not None and entry['key'] == key and os.path.isfile(entry['output']):
+                continue
+            self.invalidate(input_file, name)
+            stale[name] = key
+        return stale
+    
+    def record(self, input_file, name, key, output):
+        """Record a graph that has been built"""
+        self.entries.setdefault(input_file, {})[name] = {'key': key, 'output': output}
+    
+    def invalidate(self, input_file, name=None):
+        """Delete the graph built by one generator for a file, or all of the file's graphs, and forget them"""
+        entries = self.entries.get(input_file, {})
+        names = [name] if name is not None else list(entries.keys())
+        for n in names:
+            entry = entries.pop(n, None)
+            if entry is not None and os.path.isfile(entry['output']):
+                os.remove(entry['output'])
+        if len(entries) == 0:
+            self.entries.pop(input_file, None)
+    
+    def save(self):
+        with open(self.path, 'w') as file:
+            file.write(json.dumps(self.entries, indent = 4, sort_keys=True))
+
+
+def generate_all(xml_dir, output_dir, input_file, stream=False, incremental=True, manifest_file='build-manifest.json'):
     """
-    Generate ALL the graphs
+    Generate ALL the graphs. The XML is parsed once and shared between the generators.
+    stream: parse the XML incrementally, without keeping the tree in memory - for very large files
+    incremental: skip graphs that are already up to date, according to the manifest_file in output_dir
     """
-    # Complete
-    complete = CompleteGraphGenerator(xml_dir=xml_dir, output_dir=output_dir, file=input_file)
-    complete.generate()
-    complete.write_gexf()
-    
-    # Syuzhet
-    syuzhet = SyuzhetGraphGenerator(xml_dir=xml_dir, output_dir=output_dir, file=input_file)
-    syuzhet.generate()
-    syuzhet.write_gexf()
-    
-    # Topoi
-    topoi = TopoiGraphGenerator(xml_dir=xml_dir, output_dir=output_dir, file=input_file)
-    topoi.generate()
-    topoi.write_gexf()
-    
-    # Time Topoi
-    #time_topoi = TemporalTopoiGraphGenerator(xml_dir=xml_dir, output_dir=output_dir, file=input_file)
-    #time_topoi.generate()
-    #time_topoi.write_gexf()
-    #time_topoi.generate_simple()
-    #time_topoi.write_gexf()
-    
-    # Topoi and Archetypes
-    topoi_and_archetypes = TopoiAndArchetypeGraphGenerator(xml_dir=xml_dir, output_dir=output_dir, file=input_file)
-    topoi_and_archetypes.generate()
-    topoi_and_archetypes.write_gexf()
-    
-    # Deep Chronotopes
-    deep_chronotopes = DeepChronotopesGraphGenerator(xml_dir=xml_dir, output_dir=output_dir, file=input_file)
-    deep_chronotopes.generate()
-    deep_chronotopes.write_gexf()
-    
-    toporefs_and_archetypes = ArchetypesAndToporefsGraphGenerator(xml_dir=xml_dir, output_dir=output_dir, file=input_file)
-    toporefs_and_archetypes.generate()
-    toporefs_and_archetypes.write_gexf()
\ No newline at end of file
+    manifest = None
+    generators = all_generators
+    
+    if incremental:
+        manifest = BuildManifest(output_dir + manifest_file)
+        stale = manifest.stale(xml_dir, input_file, {'stream': stream})
+        generators = [g for g in all_generators if g.__name__ in stale]
+    
+    if len(generators) > 0:
+        document = ParsedDocument(input_file, xml_dir=xml_dir, stream=stream)
+    
+    for generator_class in generators:
+        generator = generator_class(xml_dir=xml_dir, output_dir=output_dir, file=input_file, document=document)
+        generator.generate()
+        output = generator.write_gexf()
+        if manifest is not None:
+            manifest.record(input_file, generator_class.__name__, stale[generator_class.__name__], output)
+            manifest.save()
+
+
+def generate_file(xml_dir, output_dir, input_file, stream=False, generators=None):
+    """
+    Generate all the graphs for one file of a corpus, recording errors rather than raising them so that one faulty generator or file doesn't stop the rest.
+    generators: the names of the generators to run, or None to run them all
+    Returns a dictionary of the graphs written and the errors, keyed by generator.
+    """
+    result = {'file': input_file, 'graphs': {}, 'errors': {}}
+    start = time.time()
+    
+    try:
+        document = ParsedDocument(input_file, xml_dir=xml_dir, stream=stream)
+    except Exception as e:
+        result['errors']['ParsedDocument'] = repr(e)
+        result['seconds'] = time.time() - start
+        return result
+    
+    for generator_class in all_generators:
+        if generators is not None and generator_class.__name__ not in generators:
+            continue
+        try:
+            generator = generator_class(xml_dir=xml_dir, output_dir=output_dir, file=input_file, document=document)
+            generator.generate()
+            result['graphs'][generator_class.__name__] = generator.write_gexf()
+        except Exception as e:
+            result['errors'][generator_class.__name__] = repr(e)
+    
+    result['seconds'] = time.time() - start
+    return result
+
+
+def generate_corpus(xml_dir, output_dir, workers=None, stream=False, incremental=True, summary_file='corpus-summary.json', manifest_file='build-manifest.json'):
+    """
+    Generate all the graphs for every XML file in xml_dir, spreading the files over a pool of processes.
+    workers: the number of processes to use - defaults to the number of CPUs. With 1, the files are processed in this process.
+    incremental: only build the graphs whose XML, generator or generator code have changed since the last build, according to the manifest_file in output_dir. The graphs of files that have been removed from xml_dir are deleted.
+    summary_file: the name of a JSON file, written to output_dir, recording the graphs written and the errors for each file
+    """
+    start = time.time()
+    
+    files = sorted(f for f in os.listdir(xml_dir) if f.endswith('.xml'))
+    
+    # Work out which graphs need building for each file
+    manifest = None
+    tasks = {}
+    skipped = 0
+    
+    if incremental:
+        manifest = BuildManifest(output_dir + manifest_file)
+        for input_file in list(manifest.entries.keys()):
+            if input_file not in files:
+                manifest.invalidate(input_file)
+        for input_file in files:
+            try:
+                stale = manifest.stale(xml_dir, input_file, {'stream': stream})
+            except OSError:
+                stale = {g.__name__: None for g in all_generators}
+            skipped += len(all_generators) - len(stale)
+            if len(stale) > 0:
+                tasks[input_file] = stale
+    else:
+        for input_file in files:
+            tasks[input_file] = {g.__name__: None for g in all_generators}
+    
+    if workers == 1:
+        results = [generate_file(xml_dir, output_dir, f, stream, list(stale.keys())) for f, stale in tasks.items()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(generate_file, xml_dir, output_dir, f, stream, list(stale.keys())) for f, stale in tasks.items()]
+            results = [future.result() for future in futures]
+    
+    if manifest is not None:
+        for result in results:
+            for name, output in result['graphs'].items():
+                key = tasks[result['file']][name]
+                if key is not None:
+                    manifest.record(result['file'], name, key, output)
+        manifest.save()
+    
+    failed = [result['file'] for result in results if len(result['errors']) > 0]
+    
+    summary = {
+        'xml_dir': xml_dir,
+        'output_dir': output_dir,
+        'files': len(files),
+        'built': sum(len(result['graphs']) for result in results),
+        'skipped': skipped,
+        'failed': failed,
+        'seconds': time.time() - start,
+        'results': results
+    }
+    
+    with open(output_dir + summary_file, 'w') as file:
+        file.write(json.dumps(summary, indent = 4))
+    
+    print('Built ' + str(summary['built']) + ' graphs and skipped ' + str(skipped) + ' unchanged graphs for ' + str(len(files)) + ' files in ' + str(round(summary['seconds'], 1)) + ' seconds')
+    if len(failed) > 0:
+        print('Errors in: ' + ', '.join(failed) + ' - see ' + output_dir + summary_file)
+    
+    return summary
@@ -0,0 +1,568 @@
+# Python Core
+import math
+import os
+
+# 3rd Party
+import numpy as np
+
+# This library
+import geometry
+from styles import compile_style
+from symbols import SymbolDefinitions, symbol_cache, background_cache
+from svg_writer import new_drawing, write_chunks, SvgStream
+
+
+class GraphArrays():
+    """
+    A graph in the compact form that the renderer draws from, whatever it was read from: node coordinates in arrays, edges as arrays of node indices, and the attributes used to pick styles.
+    Made from a networkx graph by from_networkx(), or from GraphML by SvgGrapher.
+    """
+
+    def __init__(self, names, x, y, node_data, sources, targets, edge_data, node_values, sizing):
+        """
+        names: the nodes' names, which are used as their labels
+        x, y: the nodes' coordinates, as laid out
+        node_data: each node's attribute dictionary, for matching node styles
+        sources, targets: the index in names of the node at each end of each edge
+        edge_data: each edge's attribute dictionary, for matching edge styles
+        node_values: the value each node's size is worked out from, or None if it doesn't have one
+        sizing: the function that works out the sizes nodes are drawn at from node_values, length_sizing() or scale_sizing()
+        """
+        self.names = names
+        self.x = np.asarray(x, dtype=float).reshape(-1)
+        self.y = np.asarray(y, dtype=float).reshape(-1)
+        self.node_data = node_data
+        self.sources = np.asarray(sources, dtype=np.int64).reshape(-1)
+        self.targets = np.asarray(targets, dtype=np.int64).reshape(-1)
+        self.edge_data = edge_data
+        self.node_values = node_values
+        self.sizing = sizing
+
+
+def from_networkx(graph):
+    """
+    Makes GraphArrays from a networkx graph that has been laid out, with 'x' and 'y' node attributes. Nodes are sized by their 'length' attribute.
+    """
+    names = list(graph.nodes)
+    index = {node: i for i, node in enumerate(names)}
+    edges = list(graph.edges())
+
+    return GraphArrays(
+        names=names,
+        x=[graph.nodes[node]['x'] for node in names],
+        y=[graph.nodes[node]['y'] for node in names],
+        node_data=[graph.nodes[node] for node in names],
+        sources=[index[source] for source, target in edges],
+        targets=[index[target] for source, target in edges],
+        edge_data=[graph.edges[edge] for edge in edges],
+        node_values=[graph.nodes[node].get('length') for node in names],
+        sizing=length_sizing
+    )
+
+
+## Node sizes
+
+def get_node_size(length):
+    """
+    Returns the size of a node, depending on the 'length' attribute
+    """
+    size = 20
+    if (length < 10):
+        return size
+    if (length > 10) and (length < 100):
+        size = length * 0.3
+    if (length > 100) and (length < 1000):
+        size = length * 0.03
+    if (length > 1000):
+        size = length * 0.003
+
+    if (size < 20):
+        return 20
+    else:
+        return size
+
+
+def length_sizing(node_values, size, node_scale, label_correction):
+    """
+    Sizes nodes by the length of text they take up (see get_node_size()), as graphs made by graph_generators are.
+    Returns the width and height of each node's symbol, the size of each node for shortening the edges that point to it (None if it has no length), the font size of each node's label and how far below the node's centre its label goes.
+    """
+    symbol_sizes = []
+    edge_sizes = []
+    font_sizes = []
+    label_offsets = []
+
+    for length in node_values:
+        try:
+            node_size = get_node_size(length)
+            edge_sizes.append(node_size)
+            label_size = node_size * size
+        except:
+            node_size = 20
+            edge_sizes.append(None)
+            label_size = 20
+        symbol_sizes.append((node_size, node_size))
+
+        font_size = (label_size * label_correction) / 2
+        if font_size < 10:
+            font_size = 10
+        font_sizes.append(font_size)
+        label_offsets.append(label_size * 0.2)
+
+    return symbol_sizes, edge_sizes, font_sizes, label_offsets
+
+
+def scale_sizing(node_values, size, node_scale, label_correction):
+    """
+    Sizes nodes by a 'size' attribute multiplied by node_scale, as in graphs exported from Gephi. Returns the same as length_sizing().
+    """
+    symbol_sizes = []
+    edge_sizes = []
+    font_sizes = []
+    label_offsets = []
+
+    for value in node_values:
+        value = float(value)
+        node_size = (node_scale * (value * size), node_scale * (value) * size)
+        symbol_sizes.append(node_size)
+        edge_sizes.append(((value * 5) / 2) * size)
+        font_sizes.append((node_size[0] * size) * label_correction)
+        label_offsets.append(node_size[0] * 0.2)
+
+    return symbol_sizes, edge_sizes, font_sizes, label_offsets
+
+
+## Edge geometry for single edges. The renderer works these out for all the edges at once, with the geometry module
+
+def calculate_edge_offset(line_start, line_end, node_size):
+    """Calculate where to start an edge, factoring in the size of the node with which it connects. See geometry.edge_offsets() for doing this for many edges at once"""
+    return tuple(geometry.edge_offsets([line_start], [line_end], [node_size])[0].tolist())
+
+
+def angle_between_points(a, b):
+    """Find the angle between two points on the basis of their coordinates"""
+    deltaY = b[1] - a[1]
+    deltaX = b[0] - a[0]
+
+    return math.atan2(deltaY, deltaX)
+
+
+def calculate_control_points(start, end):
+    """Calculate the control points for a curved line from the intersection of two circles centered on the start and end points"""
+    first, second = geometry.circle_intersections([start], [end])
+    return (tuple(first[0].tolist()), tuple(second[0].tolist()))
+
+
+def arrowhead(start_x, start_y, end_x, end_y, r):
+    """Draw the head of an arrow. Took forever, but adapted the solution from here: https://stackoverflow.com/questions/808826/draw-arrow-on-canvas-tag/36805543#36805543"""
+    return [tuple(point) for point in geometry.arrowheads([(start_x, start_y)], [(end_x, end_y)], r)[0].tolist()]
+
+
+def draw_curved_path(dwg, start, end, edge_style, control_point=None):
+    """
+    Draw a curved path in a given style
+    control_point: the curve's control point, if it has already been calculated
+    """
+    start_str = str(start[0]) + ',' + str(start[1])
+    end_str = str(end[0]) + ',' + str(end[1])
+
+    case = None
+
+    if edge_style['stroke-case'] > 0:
+        if edge_style['stroke-dasharray'] is not None:
+            case = dwg.path(
+                d='M' + start_str,
+                stroke=edge_style['stroke-case-color'],
+                fill='none',
+                stroke_width=edge_style['stroke-case'],
+                stroke_dasharray=edge_style['stroke-dasharray']
+            )
+        else:
+            case = dwg.path(
+                d='M' + start_str,
+                fill='none',
+                stroke=edge_style['stroke-case-color'],
+                stroke_width=edge_style['stroke-case'],
+            )
+
+
+    if edge_style['stroke-dasharray'] is not None:
+        path = dwg.path(
+            d='M' + start_str,
+            stroke=edge_style['stroke'],
+            fill='none',
+            stroke_dasharray=edge_style['stroke-dasharray'],
+            stroke_width=edge_style['stroke-width']
+        )
+    else:
+        path = dwg.path(
+            d='M' + start_str,
+            stroke=edge_style['stroke'],
+            fill='none',
+            stroke_width=edge_style['stroke-width']
+        )
+
+    if control_point is None:
+        control_points = calculate_control_points(start, end)
+        if (start[0] > end[0]):
+            control_point = control_points[0]
+        else:
+            control_point = control_points[1]
+
+    control = str(control_point[0]) + ', ' + str(control_point[1])
+
+    path.push('Q' + control + ' ' + end_str)
+
+    if case:
+        case.push('Q' + control + ' ' + end_str)
+        return path, case
+    else:
+        return path
+
+
+## Fitting the graph to the canvas
+
+def graph_bounds(x, y):
+    """The smallest and largest x and y coordinates of the nodes, as (minX, minY, maxX, maxY)"""
+    if len(x) == 0:
+        return 0.0, 0.0, 0.0, 0.0
+    return float(x.min()), float(y.min()), float(x.max()), float(y.max())
+
+
+def centre_graph(x, y, scale_correction=700):
+    """
+    Centres node coordinates on the origin, ready to be placed on canvases of any size with place_on_canvas().
+    Returns new arrays of x and y coordinates, and the scale that fits them on a canvas of size 1.
+    """
+    minX, minY, maxX, maxY = graph_bounds(x, y)
+    scale = max(scale_correction / maxX, scale_correction / maxY)
+    return x - (maxX + minX) / 2, y - (maxY + minY) / 2, scale
+
+
+def place_on_canvas(centred_x, centred_y, scale, size=1.0, offset=(0,0)):
+    """Scales centred coordinates from centre_graph() onto a canvas 2000 * size across, flipping them so that y goes up"""
+    scale = scale * size
+    screen_x = centred_x * scale + 1050 * size
+    screen_y = (2050 * size) - (centred_y * scale + 1050 * size)
+    return screen_x + offset[0], screen_y + offset[1]
+
+
+def fit_to_canvas(x, y, size=1.0, scale_correction=700, offset=(0,0)):
+    """
+    Scales and moves node coordinates onto the svg canvas, centring the graph on it and flipping it so that y goes up.
+    Returns new arrays of x and y coordinates, leaving x and y as they were, so a graph can be drawn any number of times.
+    x, y: arrays of the nodes' coordinates, as laid out
+    size, scale_correction, offset: as for GraphRenderer.draw_graph
+    """
+    centred_x, centred_y, scale = centre_graph(x, y, scale_correction)
+    return place_on_canvas(centred_x, centred_y, scale, size, offset)
+
+
+## Rendering
+
+class SceneGeometry():
+    """Where everything in a Scene goes when it is drawn at one size: node positions and sizes, and the edges' control points and arrowheads"""
+
+    def __init__(self, scene, size, curved, label_correction, node_scale, offset):
+        graph = scene.graph
+        screen_x, screen_y = place_on_canvas(scene.centred_x, scene.centred_y, scene.scale, size, offset)
+        self.xs = screen_x.tolist()
+        self.ys = screen_y.tolist()
+
+        self.symbol_sizes, edge_sizes, self.font_sizes, self.label_offsets = graph.sizing(graph.node_values, size, node_scale, label_correction)
+
+        ## Work out where the edges and their arrowheads go, for all the edges at once
+
+        self.sources = graph.sources.tolist()
+        self.targets = graph.targets.tolist()
+        starts = np.stack([screen_x[graph.sources], screen_y[graph.sources]], axis=1)
+        ends = np.stack([screen_x[graph.targets], screen_y[graph.targets]], axis=1)
+
+        # Shorten the lines so they don't overlap the symbols they point to. Edges to or from nodes without a size are shortened by the smallest size
+        target_sizes = []
+        for source, target in zip(self.sources, self.targets):
+            if edge_sizes[source] is None or edge_sizes[target] is None:
+                target_sizes.append(20)
+            else:
+                target_sizes.append(edge_sizes[target])
+
+        arrowhead_size = 5 * size
+
+        self.controls = None
+        self.missing = None
+        if curved == False:
+            tips = geometry.edge_offsets(starts, ends, target_sizes)
+            self.arrowheads = geometry.arrowheads(starts, tips, arrowhead_size).tolist()
+        else:
+            controls = geometry.control_points(starts, ends)
+            tips = geometry.curve_offsets(starts, controls, ends, target_sizes)
+            self.arrowheads = geometry.arrowheads(controls, tips, arrowhead_size).tolist()
+            self.controls = controls.tolist()
+
+            # If the nodes are too close together, the curve doesn't cross the edge of the target node properly, therefore don't draw the arrowhead
+            self.missing = np.isnan(tips[:, 0]).tolist()
+
+
+class Scene():
+    """
+    A graph prepared for drawing many times over, in different styles and at different sizes.
+    The graph is centred once, the geometry for each size (and curved or straight edges) is worked out the first time it is drawn at that size, and the styles for each node and edge are matched once per style, so drawing the same graph in several styles costs little more than drawing it once.
+    Made by GraphRenderer.prepare().
+    """
+
+    def __init__(self, graph, scale_correction=700):
+        """
+        graph: the GraphArrays to draw
+        scale_correction: as for GraphRenderer.draw_graph
+        """
+        self.graph = graph
+        self.centred_x, self.centred_y, self.scale = centre_graph(graph.x, graph.y, scale_correction)
+        self.geometries = {}
+        self.styles = {}
+
+    def geometry(self, size=1.0, curved=False, label_correction=1.0, node_scale=5, offset=(0,0)):
+        """The SceneGeometry for drawing the graph at a size, worked out the first time it is asked for"""
+        key = (size, bool(curved), label_correction, node_scale, tuple(offset))
+        if key not in self.geometries:
+            self.geometries[key] = SceneGeometry(self, size, curved, label_correction, node_scale, offset)
+        return self.geometries[key]
+
+    def match_styles(self, style):
+        """
+        The style compiled, with the style for each edge and the styles for each node, matched the first time the style is used
+        style: a style dictionary, or a CompiledStyle
+        """
+        # The style is kept alongside its matches, so that its id can't be reused by another style
+        found = self.styles.get(id(style))
+        if found is None:
+            compiled = compile_style(style)
+            edge_styles = [compiled.edge_style(data) for data in self.graph.edge_data]
+            node_styles = [compiled.node_styles_for(data) for data in self.graph.node_data]
+            found = self.styles[id(style)] = (style, compiled, edge_styles, node_styles)
+        return found[1:]
+
+    def render(self, dwg, style, size=1.0, curved=False, label_correction=1.0, node_scale=5, offset=(0,0), symbol_defs=False, link_background=False, background_folder=None):
+        """
+        Draws the graph onto dwg, pausing (by yielding) after each edge, node and label so that what has been drawn can be written out.
+        dwg: a drawing from svg_writer.new_drawing(), or an SvgStream
+        See GraphRenderer.draw_graph for the other options.
+        """
+        style, edge_styles, node_styles = self.match_styles(style)
+        placed = self.geometry(size, curved, label_correction, node_scale, offset)
+        xs = placed.xs
+        ys = placed.ys
+        sources = placed.sources
+        targets = placed.targets
+
+        dwg_size = (2000 * size, 2000 * size)
+
+        rect = dwg.rect(insert=(0,0), size=dwg_size, fill=style['background']['color'])
+
+        dwg.add(rect)
+
+        if style['background'].get('image') is not None:
+            path = style['background'].get('image')
+            if not link_background:
+                href = background_cache.data_uri(path)
+            else:
+                href = background_cache.link(path, background_folder)
+            image = dwg.add(dwg.image(href=href, insert=(0,0), size=dwg_size, opacity=style['background']['opacity']))
+
+        ## Draw the edges
+
+        edges_group = dwg.add(dwg.g())
+
+        for index, edge_style in enumerate(edge_styles):
+
+            # Find the coordinates of each source and target
+
+            start = (xs[sources[index]], ys[sources[index]])
+            end = (xs[targets[index]], ys[targets[index]])
+
+            if curved == False:
+                if edge_style['stroke-case'] > 0:
+                    if edge_style['stroke-dasharray'] is None:
+                        edges_group.add(dwg.line(
+                            start=start,
+                            end=end,
+                            stroke=edge_style['stroke-case-color'],
+                            stroke_width=edge_style['stroke-case']
+                        ))
+                    else:
+                        edges_group.add(dwg.line(
+                            start=start,
+                            end=end,
+                            stroke=edge_style['stroke-case-color'],
+                            stroke_width=edge_style['stroke-case'],
+                            stroke_dasharray=edge_style['stroke-dasharray']
+                        ))
+
+                if edge_style['stroke-dasharray'] is None:
+                    edges_group.add(dwg.line(
+                            start=start,
+                            end=end,
+                            stroke=edge_style['stroke'],
+                            stroke_width=edge_style['stroke-width']
+                        ))
+                else:
+                    edges_group.add(dwg.line(
+                            start=start,
+                            end=end,
+                            stroke=edge_style['stroke'],
+                            stroke_width=edge_style['stroke-width'],
+                            stroke_dasharray=edge_style['stroke-dasharray']
+                        ))
+
+                if edge_style['stroke-case'] > 0:
+                    fill = edge_style['stroke-case-color']
+                else:
+                    fill = edge_style['stroke']
+
+                edges_group.add(dwg.polygon(placed.arrowheads[index], fill=fill))
+
+            else:
+                path = draw_curved_path(dwg, start, end, edge_style, control_point=placed.controls[index])
+                if edge_style['stroke-case'] > 0:
+                    edges_group.add(path[1])
+                    edges_group.add(path[0])
+                else:
+                    edges_group.add(path)
+
+                if edge_style['stroke-case'] > 0:
+                    fill = edge_style['stroke-case-color']
+                else:
+                    fill = edge_style['stroke']
+
+                # If the arrowhead doesn't generate, don't draw it
+
+                if not placed.missing[index]:
+                    edges_group.add(dwg.polygon(placed.arrowheads[index], fill=fill))
+
+            yield
+
+        ## Now draw the nodes
+
+        nodes_group = dwg.add(dwg.g())
+        symbols = SymbolDefinitions(dwg)
+
+        for index, styles in enumerate(node_styles):
+            x = xs[index]
+            y = ys[index]
+            node_size = placed.symbol_sizes[index]
+
+            circle = nodes_group.add(dwg.circle(stroke='none', fill=style['background']['color'], center=(x,y), r=node_size[0]/2))
+
+            # Get the symbology or colour scheme
+            for node_style in styles:
+                if symbol_defs:
+                    image = nodes_group.add(symbols.use(node_style['symbol'], insert=(x - (node_size[0] / 2), y - (node_size[0] / 2)), size=node_size))
+                else:
+                    svgdata = symbol_cache.data_uri(node_style['symbol'])
+                    image = nodes_group.add(dwg.image(href=svgdata, insert=(x - (node_size[0] / 2), y - (node_size[0] / 2)), size=node_size))
+
+            yield
+
+        # Add the labels
+        for index, node in enumerate(self.graph.names):
+            x = xs[index]
+            y = ys[index]
+            label = nodes_group.add(dwg.text(text=node, insert=(x, y + placed.label_offsets[index]), font_size=placed.font_sizes[index], text_anchor='middle', font_family=style['label']['font-family'], fill=style['label']['fill']))
+
+            yield
+
+    def draw_graph(self, output_file, style, size=1.0, curved=False, label_correction=1.0, node_scale=5, offset=(0,0), symbol_defs=False, backend='svgwrite', link_background=False):
+        """Draws the graph to an svg file. Takes the same options as GraphRenderer.draw_graph"""
+
+        # Links to the background are made relative to the folder the svg is saved in
+        background_folder = None
+        if link_background and not hasattr(output_file, 'write'):
+            background_folder = os.path.dirname(os.path.abspath(output_file))
+
+        if backend == 'stream':
+            write_chunks(output_file, self.stream_graph(style, size, curved, label_correction, node_scale, offset, symbol_defs, link_background, background_folder))
+            return
+
+        dwg = new_drawing(output_file, (2000 * size, 2000 * size), backend)
+        for step in self.render(dwg, style, size, curved, label_correction, node_scale, offset, symbol_defs, link_background, background_folder):
+            pass
+        dwg.save()
+
+    def stream_graph(self, style, size=1.0, curved=False, label_correction=1.0, node_scale=5, offset=(0,0), symbol_defs=False, link_background=False, background_folder=None, chunk_size=65536):
+        """Draws the graph as a generator of chunks of svg text. Takes the same options as GraphRenderer.stream_graph"""
+        dwg = SvgStream((2000 * size, 2000 * size))
+        for step in self.render(dwg, style, size, curved, label_correction, node_scale, offset, symbol_defs, link_background, background_folder):
+            chunk = dwg.flush(chunk_size)
+            if chunk:
+                yield chunk
+        yield dwg.close()
+
+    def draw_variants(self, variants, **options):
+        """
+        Draws the graph several times over, for example in each style at several sizes
+        variants: a list of (output_file, style, size, curved)
+        options: any other options for draw_graph, used for every variant
+        """
+        for output_file, style, size, curved in variants:
+            self.draw_graph(output_file, style, size=size, curved=curved, **options)
+
+
+def render(dwg, graph, style, size=1.0, scale_correction=700, curved=False, label_correction=1.0, node_scale=5, offset=(0,0), symbol_defs=False, link_background=False, background_folder=None):
+    """
+    Draws a graph onto dwg once. See Scene for drawing the same graph many times.
+    graph: the GraphArrays to draw
+    See GraphRenderer.draw_graph for the other options.
+    """
+    return Scene(graph, scale_correction).render(dwg, style, size, curved, label_correction, node_scale, offset, symbol_defs, link_background, background_folder)
+
+
+class GraphRenderer():
+    """
+    Draws a graph as an SVG. Subclasses provide the graph, as GraphArrays, from graph_arrays().
+    """
+
+    # The default scale_correction for draw_graph
+    scale_correction = 700
+
+    def graph_arrays(self):
+        raise NotImplementedError
+
+    def draw_graph(self, output_file, style, size=1.0, scale_correction=None, curved=False, symbology=True, label_correction=1.0, node_scale=5, offset=(0,0), symbol_defs=False, backend='svgwrite', link_background=False):
+        """
+        output_file: path to an svg file, or for the 'stream' backend, a file opened for writing text
+        style: a python dictionary defining the styles for nodes and edges, or a CompiledStyle made from one
+        size: default size is 2000 * 2000 multiplied by the size value
+        scale_correction: change this value to alter the size of the graph relative to the total size of the svg canvas
+        curved: whether edge connections are curved or not
+        symbology: whether or not to use symbology when drawing the graph or a colour scheme
+        label_correction: adjusts the position of the labels relative to the centre of the nodes
+        node_scale: the size of the nodes relative to canvas
+        offset: x y coordinates to offset the centre of the graph - useful when using a background image (as defined in the style)
+        symbol_defs: write each symbol once in the svg's <defs> and draw the nodes with <use>, rather than embedding the symbol in every node
+        backend: 'svgwrite' to check the svg as it is drawn, for when changing how graphs are drawn, 'raw' to write it several times faster, or 'stream' to write it as it is drawn, without holding it in memory
+        link_background: link to the style's background image, relative to the svg, rather than embedding it in the svg
+        """
+
+        self.prepare(scale_correction).draw_graph(output_file, style, size, curved, label_correction, node_scale, offset, symbol_defs, backend, link_background)
+
+    def stream_graph(self, style, size=1.0, scale_correction=None, curved=False, symbology=True, label_correction=1.0, node_scale=5, offset=(0,0), symbol_defs=False, link_background=False, background_folder=None, chunk_size=65536):
+        """
+        Draws the graph as a generator of chunks of svg text, which can be written to a file or sent as a web response as they are drawn. Takes the same options as draw_graph.
+        background_folder: the folder to make a link to the background image relative to, when link_background is set
+        chunk_size: roughly how many characters of svg to put in each chunk
+        """
+        return self.prepare(scale_correction).stream_graph(style, size, curved, label_correction, node_scale, offset, symbol_defs, link_background, background_folder, chunk_size)
+
+    def render(self, dwg, style, size, scale_correction, curved, label_correction, node_scale, offset, symbol_defs, link_background=False, background_folder=None):
+        """Draws the graph onto dwg with Scene.render()"""
+        return self.prepare(scale_correction).render(dwg, style, size, curved, label_correction, node_scale, offset, symbol_defs, link_background, background_folder)
+
+    def prepare(self, scale_correction=None):
+        """
+        Prepares the graph as a Scene, for drawing it in several styles or at several sizes without working out the same geometry each time, e.g.
+            scene = grapher.prepare()
+            scene.draw_variants([('colour.svg', colour_style, 1.0, True), ('print.svg', print_style, 1.0, True), ('print-large.svg', print_style, 2.0, True)], backend='raw')
+        scale_correction: as for draw_graph
+        """
+        if scale_correction is None:
+            scale_correction = self.scale_correction
+        return Scene(self.graph_arrays(), scale_correction)
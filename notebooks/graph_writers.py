@@ -0,0 +1,341 @@
+# Writes graphs to GEXF and GraphML directly as text, rather than through networkx's ElementTree-based writers, which
+# build every element as an object before it is written, and to compact JSON and NumPy formats for the web viewer.
+# The graphs made by graph_generators only have plain string, integer, float and boolean attributes, which is all
+# these writers handle
+
+# Python Core
+import gzip
+import io
+import json
+import math
+import numbers
+import time
+from xml.sax.saxutils import escape
+
+# 3rd Party
+import networkx as nx
+import numpy as np
+
+# orjson is several times faster than json, but optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Entities for attribute values, on top of &, < and >, as ElementTree escapes them
+attribute_entities = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#09;'}
+
+
+def escape_attribute(value):
+    return escape(str(value), attribute_entities)
+
+
+def attribute_type(value):
+    """The GEXF and GraphML type of an attribute value, as networkx names them"""
+    if isinstance(value, bool):
+        return 'boolean'
+    elif isinstance(value, numbers.Integral):
+        return 'long'
+    elif isinstance(value, numbers.Real):
+        return 'double'
+    else:
+        return 'string'
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def attribute_types(items):
+    """
+    The attributes found in a sequence of attribute dictionaries, in the order they are first found, with their types.
+    Integer attributes that also have float values are written as doubles. Attributes whose values are all None are left out.
+    """
+    types = {}
+    for data in items:
+        for name, value in data.items():
+            if value is None:
+                continue
+            found = types.get(name)
+            if found is None:
+                types[name] = attribute_type(value)
+            elif found == 'long' and not isinstance(value, bool) and attribute_type(value) == 'double':
+                types[name] = 'double'
+    return types
+
+
+def open_output(path, compress=None):
+    """
+    Opens a file to write text to, through a large buffer
+    compress: gzip the file. Defaults to whether the path ends in '.gz'
+    """
+    if compress is None:
+        compress = str(path).endswith('.gz')
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return io.open(path, 'w', encoding='utf-8', buffering=1024 * 1024)
+
+
+# Edge attributes that GEXF has XML attributes for, which networkx writes and reads them as, rather than as attvalues
+gexf_edge_attributes = ('id', 'label', 'weight')
+
+
+def gexf_edges(graph):
+    """A graph's edges, with the keys of a multigraph's edges added to their attributes as networkx_key, as networkx writes them to GEXF"""
+    if graph.is_multigraph():
+        for source, target, key, data in graph.edges(keys=True, data=True):
+            yield source, target, dict(data, networkx_key=key)
+    else:
+        yield from graph.edges(data=True)
+
+
+def write_gexf(graph, path, compress=None):
+    """
+    Writes a networkx graph to a GEXF 1.2 file, which networkx.read_gexf reads back as the same graph
+    compress: gzip the file. Defaults to whether the path ends in '.gz'
+    Returns the path written to.
+    """
+    node_types = attribute_types(data for node, data in graph.nodes(data=True))
+    node_types.pop('label', None)
+    edge_types = attribute_types(data for source, target, data in gexf_edges(graph))
+    for name in gexf_edge_attributes:
+        edge_types.pop(name, None)
+
+    node_ids = {name: str(index) for index, name in enumerate(node_types)}
+    edge_ids = {name: str(index + len(node_ids)) for index, name in enumerate(edge_types)}
+
+    with open_output(path, compress) as file:
+        file.write('<?xml version=\'1.0\' encoding=\'utf-8\'?>\n')
+        file.write('<gexf xmlns="http://www.gexf.net/1.2draft" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.gexf.net/1.2draft http://www.gexf.net/1.2draft/gexf.xsd" version="1.2">\n')
+        file.write('  <meta lastmodifieddate="' + time.strftime('%Y-%m-%d') + '">\n    <creator>visualisation-generators</creator>\n  </meta>\n')
+        file.write('  <graph defaultedgetype="' + ('directed' if graph.is_directed() else 'undirected') + '" mode="static" name="' + escape_attribute(graph.graph.get('name', '')) + '">\n')
+
+        for attribute_class, types, ids in [('edge', edge_types, edge_ids), ('node', node_types, node_ids)]:
+            if len(types) > 0:
+                file.write('    <attributes mode="static" class="' + attribute_class + '">\n')
+                for name, attribute_type in types.items():
+                    file.write('      <attribute id="' + ids[name] + '" title="' + escape_attribute(name) + '" type="' + attribute_type + '" />\n')
+                file.write('    </attributes>\n')
+
+        file.write('    <nodes>\n')
+        lines = []
+        for node, data in graph.nodes(data=True):
+            node_id = escape_attribute(node)
+            label = escape_attribute(data['label']) if data.get('label') is not None else node_id
+            values = [(node_ids[name], value) for name, value in data.items() if value is not None and name in node_ids]
+            if len(values) == 0:
+                lines.append('      <node id="' + node_id + '" label="' + label + '" />\n')
+            else:
+                lines.append('      <node id="' + node_id + '" label="' + label + '">\n        <attvalues>\n')
+                for key, value in values:
+                    lines.append('          <attvalue for="' + key + '" value="' + escape_attribute(format_value(value)) + '" />\n')
+                lines.append('        </attvalues>\n      </node>\n')
+            if len(lines) > 4096:
+                file.write(''.join(lines))
+                lines = []
+        file.write(''.join(lines))
+        file.write('    </nodes>\n')
+
+        file.write('    <edges>\n')
+        lines = []
+        for index, (source, target, data) in enumerate(gexf_edges(graph)):
+            edge_id = data['id'] if data.get('id') is not None else index
+            start = '      <edge source="' + escape_attribute(source) + '" target="' + escape_attribute(target) + '" id="' + escape_attribute(edge_id) + '"'
+            for name in gexf_edge_attributes[1:]:
+                if data.get(name) is not None:
+                    start += ' ' + name + '="' + escape_attribute(data[name]) + '"'
+            values = [(edge_ids[name], value) for name, value in data.items() if value is not None and name in edge_ids]
+            if len(values) == 0:
+                lines.append(start + ' />\n')
+            else:
+                lines.append(start + '>\n        <attvalues>\n')
+                for key, value in values:
+                    lines.append('          <attvalue for="' + key + '" value="' + escape_attribute(format_value(value)) + '" />\n')
+                lines.append('        </attvalues>\n      </edge>\n')
+            if len(lines) > 4096:
+                file.write(''.join(lines))
+                lines = []
+        file.write(''.join(lines))
+        file.write('    </edges>\n  </graph>\n</gexf>\n')
+
+    return path
+
+
+def write_graphml(graph, path, compress=None):
+    """
+    Writes a networkx graph to a GraphML file, which networkx.read_graphml (and graphml.read_graphml) reads back as the same graph
+    compress: gzip the file. Defaults to whether the path ends in '.gz'
+    Returns the path written to.
+    """
+    node_types = attribute_types(data for node, data in graph.nodes(data=True))
+    edge_types = attribute_types(data for source, target, data in graph.edges(data=True))
+
+    node_keys = {name: 'd' + str(index) for index, name in enumerate(node_types)}
+    edge_keys = {name: 'd' + str(index + len(node_keys)) for index, name in enumerate(edge_types)}
+
+    with open_output(path, compress) as file:
+        file.write('<?xml version=\'1.0\' encoding=\'utf-8\'?>\n')
+        file.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+
+        for attribute_for, types, keys in [('node', node_types, node_keys), ('edge', edge_types, edge_keys)]:
+            for name, attribute_type in types.items():
+                file.write('  <key id="' + keys[name] + '" for="' + attribute_for + '" attr.name="' + escape_attribute(name) + '" attr.type="' + attribute_type + '" />\n')
+
+        file.write('  <graph edgedefault="' + ('directed' if graph.is_directed() else 'undirected') + '">\n')
+
+        # A multigraph's edges are written with their keys as their ids, which networkx reads back as their keys
+        if graph.is_multigraph():
+            edges = graph.edges(keys=True, data=True)
+        else:
+            edges = ((source, target, None, data) for source, target, data in graph.edges(data=True))
+
+        for element, items, keys in [('node', ((node, None, None, data) for node, data in graph.nodes(data=True)), node_keys), ('edge', edges, edge_keys)]:
+            lines = []
+            for first, second, edge_key, data in items:
+                if element == 'node':
+                    start = '    <node id="' + escape_attribute(first) + '"'
+                else:
+                    start = '    <edge source="' + escape_attribute(first) + '" target="' + escape_attribute(second) + '"'
+                    if edge_key is not None:
+                        start += ' id="' + escape_attribute(edge_key) + '"'
+                values = [(keys[name], value) for name, value in data.items() if value is not None]
+                if len(values) == 0:
+                    lines.append(start + ' />\n')
+                else:
+                    lines.append(start + '>\n')
+                    for key, value in values:
+                        lines.append('      <data key="' + key + '">' + escape(format_value(value)) + '</data>\n')
+                    lines.append('    </' + element + '>\n')
+                if len(lines) > 4096:
+                    file.write(''.join(lines))
+                    lines = []
+            file.write(''.join(lines))
+
+        file.write('  </graph>\n</graphml>\n')
+
+    return path
+
+
+## Compact formats for the web viewer
+
+def column_value(value, attribute_type):
+    """
+    A value as the plain Python type of its column, as NumPy numbers can't be written to JSON.
+    NaN is missing, as it is in the columns read back from .npz files, and becomes None, as JSON has no NaN.
+    """
+    if value is None:
+        return None
+    elif attribute_type == 'long':
+        return int(value)
+    elif attribute_type == 'double':
+        value = float(value)
+        return None if math.isnan(value) else value
+    elif attribute_type == 'boolean':
+        return bool(value)
+    return str(value)
+
+
+def node_link_columns(graph):
+    """
+    A graph as a dictionary of columns: the node ids, each edge's source and target as indices into them, and a list of every node's (and edge's) values for each attribute, with None where one doesn't have a value
+    """
+    nodes = list(graph.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    node_types = attribute_types(data for node, data in graph.nodes(data=True))
+    edge_types = attribute_types(data for source, target, data in graph.edges(data=True))
+
+    node_data = [data for node, data in graph.nodes(data=True)]
+    edge_data = [data for source, target, data in graph.edges(data=True)]
+
+    return {
+        'directed': graph.is_directed(),
+        'nodes': [str(node) for node in nodes],
+        'edges': {
+            'source': [index[source] for source, target in graph.edges()],
+            'target': [index[target] for source, target in graph.edges()]
+        },
+        'node_types': node_types,
+        'node_attributes': {name: [column_value(data.get(name), attribute_type) for data in node_data] for name, attribute_type in node_types.items()},
+        'edge_types': edge_types,
+        'edge_attributes': {name: [column_value(data.get(name), attribute_type) for data in edge_data] for name, attribute_type in edge_types.items()}
+    }
+
+
+def write_json(graph, path, compress=None):
+    """
+    Writes a graph as compact node-link JSON, with nodes referred to by their index rather than their id, and attributes stored as columns:
+        {"directed": true, "nodes": ["id", ...], "edges": {"source": [0, ...], "target": [1, ...]},
+         "node_types": {"length": "long", ...}, "node_attributes": {"length": [12, null, ...], ...},
+         "edge_types": {...}, "edge_attributes": {"relation": ["direct", ...], ...}}
+    Uses orjson if it is installed, and the json module if not.
+    compress: gzip the file. Defaults to whether the path ends in '.gz'
+    Returns the path written to.
+    """
+    columns = node_link_columns(graph)
+    if orjson is not None:
+        data = orjson.dumps(columns)
+    else:
+        data = json.dumps(columns, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+    if compress is None:
+        compress = str(path).endswith('.gz')
+    with (gzip.open(path, 'wb') if compress else io.open(path, 'wb')) as file:
+        file.write(data)
+    return path
+
+
+def read_json(path):
+    """Reads a graph written by write_json back into networkx"""
+    opener = gzip.open if str(path).endswith('.gz') else io.open
+    with opener(path, 'rb') as file:
+        data = file.read()
+    columns = orjson.loads(data) if orjson is not None else json.loads(data)
+
+    graph = nx.DiGraph() if columns['directed'] else nx.Graph()
+    nodes = columns['nodes']
+    for i, node in enumerate(nodes):
+        graph.add_node(node, **{name: values[i] for name, values in columns['node_attributes'].items() if values[i] is not None})
+    for i, (source, target) in enumerate(zip(columns['edges']['source'], columns['edges']['target'])):
+        graph.add_edge(nodes[source], nodes[target], **{name: values[i] for name, values in columns['edge_attributes'].items() if values[i] is not None})
+    return graph
+
+
+def write_npz(graph, path):
+    """
+    Writes a graph as a compressed NumPy .npz of arrays, for loading large graphs without parsing JSON. The arrays are:
+        nodes: the node ids
+        edges.source, edges.target: each edge's source and target, as indices into nodes
+        node.<name>, edge.<name>: numeric attributes, as float64 with NaN for missing values, or int64 if no values are missing. Booleans are int8, with -1 for missing values
+        node.<name>.codes, node.<name>.values (and the same for edges): string attributes, as an index into an array of their distinct values, with -1 for missing values
+    Returns the path written to.
+    """
+    columns = node_link_columns(graph)
+    arrays = {
+        'nodes': np.array(columns['nodes'], dtype=str),
+        'edges.source': np.array(columns['edges']['source'], dtype=np.int64),
+        'edges.target': np.array(columns['edges']['target'], dtype=np.int64)
+    }
+
+    for prefix in ['node', 'edge']:
+        for name, attribute_type in columns[prefix + '_types'].items():
+            values = columns[prefix + '_attributes'][name]
+            key = prefix + '.' + name
+            if attribute_type in ('long', 'double'):
+                if attribute_type == 'long' and None not in values:
+                    arrays[key] = np.array(values, dtype=np.int64)
+                else:
+                    arrays[key] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            elif attribute_type == 'boolean':
+                arrays[key] = np.array([-1 if value is None else int(value) for value in values], dtype=np.int8)
+            else:
+                distinct = sorted(set(value for value in values if value is not None))
+                codes = {value: i for i, value in enumerate(distinct)}
+                arrays[key + '.codes'] = np.array([-1 if value is None else codes[value] for value in values], dtype=np.int32)
+                arrays[key + '.values'] = np.array(distinct, dtype=str)
+
+    with io.open(path, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+    return path
@@ -0,0 +1,174 @@
+# Python Core
+import math
+
+# 3rd Party
+from lxml import etree
+import numpy as np
+
+
+GRAPHML_NS = '{http://graphml.graphdrawing.org/xmlns}'
+
+# GraphML attribute types, and the NumPy types their columns are stored as
+NUMERIC_TYPES = {'int': np.int64, 'long': np.int64, 'integer': np.int64, 'float': np.float64, 'double': np.float64}
+
+
+class GraphMLColumns():
+    """
+    A GraphML graph read into columns: one array per attribute, indexed like the lists of node and edge ids.
+    Attributes are looked up by their names (attr.name), not by the ids of their <key>s, and their values are converted once to the type their key declares.
+    Numeric columns are NumPy number arrays, with NaN for nodes or edges that have no value. Other columns are NumPy object arrays, with None for missing values.
+    """
+
+    def __init__(self):
+        # Key ids to {'name', 'type', 'for', 'default'}
+        self.keys = {}
+
+        self.node_ids = []
+        self.node_index = {}
+        self.node_columns = {}
+
+        self.edge_ids = []
+        self.sources = np.zeros(0, dtype=np.int64)
+        self.targets = np.zeros(0, dtype=np.int64)
+        self.edge_columns = {}
+
+        self.directed = True
+
+    def node_column(self, name):
+        """The values of a node attribute, by its name"""
+        return self.node_columns[name]
+
+    def edge_column(self, name):
+        """The values of an edge attribute, by its name"""
+        return self.edge_columns[name]
+
+    def node_rows(self):
+        """Each node's attributes as a dictionary of names to values, leaving out missing values"""
+        return rows(self.node_columns, len(self.node_ids))
+
+    def edge_rows(self):
+        """Each edge's attributes as a dictionary of names to values, leaving out missing values"""
+        return rows(self.edge_columns, len(self.edge_ids))
+
+
+def rows(columns, length):
+    """Turns columns back into a dictionary for each row, leaving out missing values"""
+    names = list(columns.keys())
+    values = [columns[name].tolist() for name in names]
+
+    result = [{} for i in range(length)]
+    for name, column in zip(names, values):
+        for row, value in zip(result, column):
+            if value is not None and not (isinstance(value, float) and math.isnan(value)):
+                row[name] = value
+    return result
+
+
+def convert(rows, values, count, attr_type, default=None):
+    """
+    Converts the values of one GraphML attribute to a column of attr_type
+    rows: the index of the node or edge each of values belongs to
+    values: the values, as the strings they were written as
+    count: the number of nodes or edges, and so the length of the column
+    default: the key's default value, used for nodes or edges without one
+    """
+    if attr_type in NUMERIC_TYPES:
+        dtype = NUMERIC_TYPES[attr_type]
+        if len(rows) < count and (dtype is np.int64 and default is None):
+            # Missing values are NaN, which integers can't be
+            dtype = np.float64
+        if default is None:
+            default = np.nan if len(rows) < count else 0
+        column = np.full(count, default, dtype=dtype)
+        column[rows] = np.array(values, dtype=dtype)
+        return column
+
+    if attr_type == 'boolean':
+        values = [value is not None and value.strip().lower() in ('true', '1') for value in values]
+        if default is not None:
+            default = default.strip().lower() in ('true', '1')
+    column = np.full(count, default, dtype=object)
+    column[rows] = values
+    return column
+
+
+def read_graphml(path, stream=False):
+    """
+    Reads a GraphML file into GraphMLColumns
+    path: path to a GraphML file, such as one exported from Gephi
+    stream: read the file with iterparse, freeing each node and edge once it's read, so that very large files don't need to fit in memory as XML
+    """
+    graph = GraphMLColumns()
+    # Key ids to the rows that have a value for them, and their values
+    node_values = {}
+    edge_values = {}
+    sources = []
+    targets = []
+    data_tags = (GRAPHML_NS + 'data', 'data')
+
+    def read_data(element, values, row):
+        for data in element.iterchildren(*data_tags):
+            key = data.get('key')
+            found = values.get(key)
+            if found is None:
+                found = values[key] = ([], [])
+            found[0].append(row)
+            found[1].append(data.text)
+
+    def read_key(element):
+        graph.keys[element.get('id')] = {
+            'name': element.get('attr.name', element.get('id')),
+            'type': element.get('attr.type', 'string'),
+            'for': element.get('for', 'all'),
+            'default': element.findtext(GRAPHML_NS + 'default', element.findtext('default'))
+        }
+
+    def read_graph(element):
+        graph.directed = element.get('edgedefault', 'directed') == 'directed'
+
+    def read_node(element):
+        node_id = element.get('id')
+        graph.node_index[node_id] = len(graph.node_ids)
+        read_data(element, node_values, len(graph.node_ids))
+        graph.node_ids.append(node_id)
+
+    def read_edge(element):
+        edge_id = element.get('id')
+        if edge_id is None:
+            edge_id = 'e' + str(len(graph.edge_ids))
+        sources.append(element.get('source'))
+        targets.append(element.get('target'))
+        read_data(element, edge_values, len(graph.edge_ids))
+        graph.edge_ids.append(edge_id)
+
+    readers = {}
+    for tag, reader in [('key', read_key), ('graph', read_graph), ('node', read_node), ('edge', read_edge)]:
+        readers[GRAPHML_NS + tag] = reader
+        readers[tag] = reader
+
+    if stream:
+        for event, element in etree.iterparse(path, events=('end',), tag=list(readers)):
+            readers[element.tag](element)
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    else:
+        for element in etree.parse(path).getroot().iter(*readers):
+            readers[element.tag](element)
+
+    # Nodes that edges refer to without declaring them are added, as networkx does
+    for node_id in sources + targets:
+        if node_id not in graph.node_index:
+            graph.node_index[node_id] = len(graph.node_ids)
+            graph.node_ids.append(node_id)
+
+    # Convert the columns, naming them after their keys' attr.name
+    for values, columns, count in [(node_values, graph.node_columns, len(graph.node_ids)), (edge_values, graph.edge_columns, len(graph.edge_ids))]:
+        for key, (rows, column) in values.items():
+            declaration = graph.keys.get(key, {'name': key, 'type': 'string', 'default': None})
+            columns[declaration['name']] = convert(rows, column, count, declaration['type'], declaration['default'])
+
+    index = graph.node_index
+    graph.sources = np.array([index[node_id] for node_id in sources], dtype=np.int64)
+    graph.targets = np.array([index[node_id] for node_id in targets], dtype=np.int64)
+    return graph
@@ -0,0 +1,407 @@
+# Python Core
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# 3rd Party
+import networkx as nx
+import numpy as np
+
+
+class LayoutCache:
+    """
+    Caches graph layouts in memory and, optionally, on disk, keyed on the structure of the graph and the layout parameters, so that re-rendering a graph doesn't repeat the layout.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=64, max_disk_bytes=100 * 1024 * 1024):
+        """
+        cache_dir: a directory in which to keep layouts between sessions, or None to keep them in memory only
+        max_entries: the number of layouts to keep in memory, the least recently used being dropped first
+        max_disk_bytes: the most space the layouts in cache_dir may take up, the least recently used being deleted first
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        # The key of the latest layout of each labelled graph, so that a graph that has since changed can be laid out from it
+        self.labels = {}
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            try:
+                with open(os.path.join(cache_dir, 'labels.index')) as file:
+                    self.labels = json.load(file)
+            except (OSError, ValueError):
+                pass
+
+    def key(self, graph, algorithm, scale):
+        """A hash of the nodes and edges of a graph and the layout parameters. Node and edge attributes are ignored."""
+        nodes = sorted(str(node) for node in graph.nodes)
+        edges = sorted([str(source), str(target)] for source, target in graph.edges)
+        structure = json.dumps([nodes, edges, graph.is_directed(), algorithm, scale])
+        return hashlib.sha256(structure.encode()).hexdigest()
+
+    def get(self, key):
+        """Returns a dictionary of node names to (x, y) positions, or None if the layout isn't cached"""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        if self.cache_dir is None:
+            return None
+
+        path = os.path.join(self.cache_dir, key + '.json')
+        try:
+            with open(path) as file:
+                positions = {node: tuple(coords) for node, coords in json.load(file).items()}
+        except (OSError, ValueError):
+            return None
+
+        # Mark the file as recently used, for eviction
+        os.utime(path)
+        self.remember(key, positions)
+        return positions
+
+    def put(self, key, positions, label=None):
+        """
+        Cache a dictionary of node names to (x, y) positions
+        label: a name for the graph, such as its output file name, under which this is recorded as the latest layout
+        """
+        positions = {str(node): (float(coords[0]), float(coords[1])) for node, coords in positions.items()}
+        self.remember(key, positions)
+
+        if label is not None:
+            self.labels[label] = key
+
+        if self.cache_dir is not None:
+            with open(os.path.join(self.cache_dir, key + '.json'), 'w') as file:
+                json.dump(positions, file)
+            if label is not None:
+                with open(os.path.join(self.cache_dir, 'labels.index'), 'w') as file:
+                    json.dump(self.labels, file)
+            self.evict()
+
+        return positions
+
+    def latest(self, label):
+        """Returns the latest layout cached for a label, or None"""
+        key = self.labels.get(label)
+        if key is None:
+            return None
+        return self.get(key)
+
+    def remember(self, key, positions):
+        self.entries[key] = positions
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def evict(self):
+        """Delete the least recently used layouts from cache_dir until it fits within max_disk_bytes"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """Forget every cached layout, in memory and on disk"""
+        self.entries.clear()
+        self.labels.clear()
+        if self.cache_dir is not None:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json') or name == 'labels.index':
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+def grid_repulsion(positions, k, limit=64):
+    """
+    Returns the Fruchterman-Reingold repulsion, k^2 / d, between every pair of points closer than 2k. Points are binned into a grid of 2k cells by sorting on their cell, so that only points in neighbouring cells are compared.
+    Where a pair of neighbouring cells would mean comparing more than limit pairs of points, each point is instead repelled by the centre of mass of the other cell, so that crowded regions don't make the cost quadratic.
+    """
+    n = len(positions)
+    cell_size = 2 * k
+
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = cells[:, 1].max() + 2
+    keys = cells[:, 0] * width + cells[:, 1]
+
+    order = np.argsort(keys, kind='stable')
+    unique_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    cell_of_point = np.searchsorted(unique_keys, keys)
+    centres = scatter(cell_of_point, positions, len(unique_keys)) / counts[:, None]
+
+    displacement = np.zeros((n, 2))
+
+    # Half of the neighbouring cells, so each pair of cells is visited once
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        same_cell = dx == 0 and dy == 0
+        neighbour_keys = unique_keys + dx * width + dy
+        found = np.searchsorted(unique_keys, neighbour_keys)
+        found[found >= len(unique_keys)] = 0
+        matched = unique_keys[found] == neighbour_keys
+
+        a = np.nonzero(matched)[0]
+        b = found[matched]
+        block = counts[a] * counts[b]
+        exact = block <= limit
+
+        # Compare every pair of points in the sparser pairs of cells
+        a_exact = a[exact]
+        b_exact = b[exact]
+        block = block[exact]
+        total = block.sum()
+        if total > 0:
+            count_b = counts[b_exact]
+            block_starts = np.repeat(np.cumsum(block) - block, block)
+            offset = np.arange(total) - block_starts
+            width_b = np.repeat(count_b, block)
+            local_a = offset // width_b
+            local_b = offset % width_b
+
+            i = order[np.repeat(starts[a_exact], block) + local_a]
+            j = order[np.repeat(starts[b_exact], block) + local_b]
+
+            if same_cell:
+                keep = local_a < local_b
+                i = i[keep]
+                j = j[keep]
+
+            delta = positions[i] - positions[j]
+            distance = np.sqrt((delta ** 2).sum(axis=1))
+            near = distance < cell_size
+            i = i[near]
+            j = j[near]
+            delta = delta[near]
+            distance = np.maximum(distance[near], 0.01)
+            force = delta * (k * k / distance ** 2)[:, None]
+            displacement += scatter(i, force, n) - scatter(j, force, n)
+
+        # Repel the points in the crowded pairs of cells from the centre of mass of the other cell
+        a_dense = a[~exact]
+        b_dense = b[~exact]
+        if len(a_dense) > 0:
+            partners = []
+            partner = np.full(len(unique_keys), -1)
+            partner[a_dense] = b_dense
+            partners.append(partner)
+            if not same_cell:
+                partner = np.full(len(unique_keys), -1)
+                partner[b_dense] = a_dense
+                partners.append(partner)
+
+            for partner in partners:
+                other = partner[cell_of_point]
+                selected = other >= 0
+                other = other[selected]
+                mass = counts[other] - 1 if same_cell else counts[other]
+                delta = positions[selected] - centres[other]
+                distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 0.01)
+                displacement[selected] += delta * (mass * k * k / distance ** 2)[:, None]
+
+    return displacement
+
+
+def scatter(index, values, length):
+    """Sums rows of an (m, 2) array into an (length, 2) array by index - a faster np.add.at"""
+    return np.stack([
+        np.bincount(index, weights=values[:, 0], minlength=length),
+        np.bincount(index, weights=values[:, 1], minlength=length)
+    ], axis=1)
+
+
+def forces(positions, edges, k, coarse=16):
+    """
+    Returns the displacement of each point under Fruchterman-Reingold forces, with an ideal edge length of k.
+    Repulsion between nodes is calculated for nodes in neighbouring cells of a grid, and approximated from the centres of mass of a coarse grid further away, so each call costs roughly O(n + e) rather than O(n^2).
+    edges: an (e, 2) array of indices into positions
+    """
+    n = len(positions)
+
+    # Repulsion between near neighbours: FR's grid variant, ignoring pairs further apart than 2k
+    displacement = grid_repulsion(positions, k)
+
+    # Repulsion from distant nodes, approximated by the centres of mass of a coarse grid. The force is calculated between cells and shared by every node in a cell.
+    low = positions.min(axis=0)
+    cell_size = max((positions.max(axis=0) - low).max() / coarse, 2 * k)
+    cells = np.minimum(((positions - low) / cell_size).astype(np.int64), coarse - 1)
+    keys = cells[:, 0] * coarse + cells[:, 1]
+    occupied, cell_index, mass = np.unique(keys, return_inverse=True, return_counts=True)
+    cell_index = cell_index.reshape(-1)
+    centres = scatter(cell_index, positions, len(occupied)) / mass[:, None]
+    delta = centres[:, None, :] - centres[None, :, :]
+    distance = np.maximum(np.sqrt((delta ** 2).sum(axis=2)), 0.01)
+    force = np.where(distance > cell_size, mass[None, :] * k * k / (distance ** 2), 0)
+    displacement += (delta * force[:, :, None]).sum(axis=1)[cell_index]
+
+    # Attraction along the edges
+    if len(edges) > 0:
+        delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 0.01)
+        force = delta * (distance / k)[:, None]
+        displacement += scatter(edges[:, 1], force, n) - scatter(edges[:, 0], force, n)
+
+    return displacement
+
+
+def relax(positions, edges, k, iterations, temperature, movable=None):
+    """
+    Moves the points under forces() for a number of iterations, limiting the movement of each point to the temperature, which cools to nothing as the layout settles.
+    movable: a boolean array of the points that may move, or None to move them all
+    """
+    cooling = temperature / (iterations + 1)
+
+    for iteration in range(iterations):
+        displacement = forces(positions, edges, k)
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 0.01)
+        step = displacement * (np.minimum(length, temperature) / length)[:, None]
+        if movable is None:
+            positions += step
+        else:
+            positions[movable] += step[movable]
+        temperature -= cooling
+
+    return positions
+
+
+def edge_array(graph, index):
+    """The edges of a graph as an (e, 2) array of node indices, without self-loops"""
+    return np.array([(index[u], index[v]) for u, v in graph.edges if u != v], dtype=np.int64).reshape(-1, 2)
+
+
+def force_layout(graph, scale=1, center=(0, 0), iterations=100, seed=None):
+    """
+    A force-directed (Fruchterman-Reingold) layout in NumPy, for graphs too large for networkx's layouts. See forces() for how its cost is kept down.
+    Returns a dictionary of nodes to positions, scaled like networkx's layouts so that the furthest node is scale from center.
+    """
+    nodes = list(graph.nodes)
+    n = len(nodes)
+    if n == 0:
+        return {}
+
+    center = np.asarray(center, dtype=float)
+    if n == 1:
+        return {nodes[0]: center}
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = edge_array(graph, index)
+
+    # Nodes are laid out with an ideal edge length of 1, in an area that grows with the number of nodes
+    k = 1.0
+    side = np.sqrt(n)
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-side / 2, side / 2, (n, 2))
+
+    positions = relax(positions, edges, k, iterations, side / 10)
+
+    # Rescale in the same way as networkx.rescale_layout
+    positions -= positions.mean(axis=0)
+    limit = np.abs(positions).max()
+    if limit > 0:
+        positions *= scale / limit
+    positions += center
+
+    return dict(zip(nodes, positions))
+
+
+def incremental_layout(graph, previous, iterations=20, seed=None):
+    """
+    Lays out a graph that has changed a little since it was last laid out, without moving the nodes that were already there.
+    New nodes are placed at the centre of their already-placed neighbours, or anywhere in the layout if they have none, then relaxed with a short force-directed pass while the other nodes stay fixed.
+    previous: a dictionary of node names to (x, y) positions from the earlier layout
+    Returns a dictionary of nodes to positions, in the same coordinates as previous.
+    """
+    nodes = list(graph.nodes)
+    n = len(nodes)
+    if n == 0:
+        return {}
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = edge_array(graph, index)
+    rng = np.random.default_rng(seed)
+
+    positions = np.zeros((n, 2))
+    placed = np.zeros(n, dtype=bool)
+    for node, i in index.items():
+        coords = previous.get(node, previous.get(str(node)))
+        if coords is not None:
+            positions[i] = coords
+            placed[i] = True
+
+    if not placed.any():
+        return force_layout(graph, seed=seed)
+
+    new = ~placed
+    if not new.any():
+        return dict(zip(nodes, positions))
+
+    # Use the typical length of the edges that are already laid out as the ideal edge length
+    known_edges = edges[placed[edges[:, 0]] & placed[edges[:, 1]]]
+    if len(known_edges) > 0:
+        k = np.median(np.sqrt(((positions[known_edges[:, 0]] - positions[known_edges[:, 1]]) ** 2).sum(axis=1)))
+    else:
+        k = 0
+    if k <= 0:
+        k = np.ptp(positions[placed], axis=0).max() / np.sqrt(n) or 1.0
+
+    # Place the new nodes next to their placed neighbours, working outwards from the existing layout
+    undirected = graph.to_undirected(as_view=True)
+    remaining = [node for node in nodes if new[index[node]]]
+    while len(remaining) > 0:
+        unplaced = []
+        for node in remaining:
+            neighbours = [index[neighbour] for neighbour in undirected.neighbors(node) if placed[index[neighbour]]]
+            if len(neighbours) > 0:
+                positions[index[node]] = positions[neighbours].mean(axis=0) + rng.uniform(-k / 2, k / 2, 2)
+                placed[index[node]] = True
+            else:
+                unplaced.append(node)
+        if len(unplaced) == len(remaining):
+            # The rest aren't connected to the layout, so scatter them across it
+            low = positions[placed].min(axis=0)
+            high = positions[placed].max(axis=0)
+            for node in unplaced:
+                positions[index[node]] = rng.uniform(low, high)
+            break
+        remaining = unplaced
+
+    # Relax the new nodes in units of the ideal edge length, then scale back. The low temperature keeps them
+    # within a couple of edge lengths of where they were placed, so the rest of the layout can't push them away
+    positions = relax(positions / k, edges, 1.0, iterations, 0.2, movable=new) * k
+
+    return dict(zip(nodes, positions))
+
+
+def read_positions(path):
+    """
+    Reads node positions from a GraphML or GEXF file, such as a graph previously laid out here or in Gephi.
+    Positions are taken from 'x' and 'y' node attributes, or from GEXF viz:position elements.
+    Returns a dictionary of node names to (x, y) positions.
+    """
+    if path.endswith('.gexf'):
+        graph = nx.read_gexf(path)
+    else:
+        graph = nx.read_graphml(path)
+
+    positions = {}
+    for node, data in graph.nodes(data=True):
+        if 'x' in data and 'y' in data:
+            positions[node] = (float(data['x']), float(data['y']))
+        elif 'position' in data.get('viz', {}):
+            position = data['viz']['position']
+            positions[node] = (float(position['x']), float(position['y']))
+    return positions
+
+
+# The cache used by GraphGenerator.layout unless another is given. Replace it with LayoutCache(cache_dir=...) to keep layouts on disk.
+layout_cache = LayoutCache()
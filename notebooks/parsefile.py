@@ -2,6 +2,10 @@
 from xml.sax.handler import ContentHandler
 from xml.sax import make_parser
 
+import os
+
+from lxml import etree
+
 def parse_file(file):
     parser = make_parser(  )
     parser.setContentHandler(ContentHandler(  ))
@@ -12,4 +16,225 @@ def check_xml_is_well_formed(file):
         parse_file(file)
         print("XML is well-formed")
     except Exception as e:
-        print("XML is NOT well-formed! %s" % (e))
\ No newline at end of file
+        print("XML is NOT well-formed! %s" % (e))
+
+
+class Topos:
+    """A topos element, reduced to the values the graph generators need"""
+
+    __slots__ = ('position', 'attrib', 'sourceline', 'length', 'raw_length', 'lead_length', 'toporefs')
+
+    def __init__(self, position, attrib, sourceline, length, raw_length, lead_length):
+        # position: index of the element in document order, counting topos, connection and toporef elements
+        # length: number of characters in the topos, stripped of leading and trailing whitespace
+        # raw_length: number of characters in the topos, unstripped
+        # lead_length: number of characters before the first child element
+        self.position = position
+        self.attrib = attrib
+        self.sourceline = sourceline
+        self.length = length
+        self.raw_length = raw_length
+        self.lead_length = lead_length
+        self.toporefs = []
+
+
+class Connection:
+    """A connection element, with the attributes of the element that contains it"""
+
+    __slots__ = ('position', 'attrib', 'sourceline', 'parent_tag', 'parent_attrib')
+
+    def __init__(self, position, attrib, sourceline, parent_tag, parent_attrib):
+        self.position = position
+        self.attrib = attrib
+        self.sourceline = sourceline
+        self.parent_tag = parent_tag
+        self.parent_attrib = parent_attrib
+
+
+class Toporef:
+    """A toporef element, with the framename of the topos that contains it"""
+
+    __slots__ = ('position', 'attrib', 'sourceline', 'text', 'parent_tag', 'containing_node')
+
+    def __init__(self, position, attrib, sourceline, text, parent_tag, containing_node):
+        # containing_node: the framename of the parent topos, or of the topos containing the parent connection
+        self.position = position
+        self.attrib = attrib
+        self.sourceline = sourceline
+        self.text = text
+        self.parent_tag = parent_tag
+        self.containing_node = containing_node
+
+
+class TextLength:
+    """Counts the characters in a run of text that arrives in pieces, with and without its leading and trailing whitespace"""
+
+    def __init__(self):
+        self.raw = 0
+        # Whitespace before the first non-whitespace character, or None until one has been seen
+        self.leading = None
+        self.trailing = 0
+
+    def feed(self, text):
+        if not text:
+            return
+        self.raw += len(text)
+        stripped = text.rstrip()
+        if stripped == '':
+            self.trailing += len(text)
+            return
+        if self.leading is None:
+            self.leading = self.raw - len(text.lstrip())
+        self.trailing = len(text) - len(stripped)
+
+    def stripped(self):
+        """The equivalent of len(text.strip())"""
+        if self.leading is None:
+            return 0
+        return self.raw - self.leading - self.trailing
+
+
+class ParsedDocument:
+    """
+    A Chrono-carto encoded XML file, parsed once and shared between the graph generators.
+    The topos, connection and toporef elements are collected in document order in a single pass.
+    """
+
+    file = None
+    xml_element = None
+
+    def __init__(self, file, xml_dir='', stream=False):
+        """
+        file: the name of a file in xml_dir, a path, or a file-like object
+        stream: read the file with iterparse, discarding each element once it has been recorded, so that memory use depends on the number of topoi, connections and toporefs rather than the size of the text. No tree is kept, so xml_element will be None.
+        """
+        self.file = file
+
+        self.elements = []
+        self.topoi = []
+        self.connections = []
+        self.toporefs = []
+
+        if stream:
+            self.read_stream(file, xml_dir)
+        else:
+            self.read_tree(file, xml_dir)
+
+    def read_tree(self, file, xml_dir):
+        """Parse the whole file, then record its elements"""
+        try:
+            tree = etree.parse(xml_dir + file)
+        except:
+            tree = etree.parse(file)
+
+        self.xml_element = tree.getroot()
+
+        # Keyed on the lxml elements, which stay alive (and so keep their identity) while referenced here
+        topos_records = {}
+
+        for el in self.xml_element.iter('topos', 'connection', 'toporef'):
+            position = len(self.elements)
+            attrib = dict(el.attrib)
+
+            if el.tag == 'topos':
+                text = ''.join(el.itertext())
+                record = Topos(position, attrib, el.sourceline, len(text.strip()), len(text), len(el.text or ''))
+                topos_records[el] = record
+                self.topoi.append(record)
+
+            elif el.tag == 'connection':
+                parent = el.getparent()
+                record = Connection(position, attrib, el.sourceline, parent.tag, dict(parent.attrib))
+                self.connections.append(record)
+
+            else:
+                parent = el.getparent()
+                containing_node = None
+                if parent.tag == 'topos':
+                    containing_node = parent.attrib.get('framename')
+                elif parent.tag == 'connection':
+                    grandparent = parent.getparent()
+                    if grandparent is not None:
+                        containing_node = grandparent.attrib.get('framename')
+                record = Toporef(position, attrib, el.sourceline, el.text, parent.tag, containing_node)
+                self.toporefs.append(record)
+
+                # Register the toporef with every topos that encloses it, so topos.toporefs matches topos.iter('toporef')
+                for ancestor in el.iterancestors('topos'):
+                    topos_records[ancestor].toporefs.append(record)
+
+            self.elements.append(record)
+
+    def read_stream(self, file, xml_dir):
+        """
+        Record the elements as they are parsed. Text is counted a piece at a time: each piece of text is complete once the element that follows it starts, or its parent ends, and is added to every topos that is open at that point.
+        """
+        source = file
+        if isinstance(file, str) and os.path.isfile(xml_dir + file):
+            source = xml_dir + file
+
+        # The topoi that have started but not yet ended, with their text counts
+        open_topoi = []
+
+        for event, el in etree.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                parent = el.getparent()
+                if parent is not None:
+                    previous = el.getprevious()
+                    piece = parent.text if previous is None else previous.tail
+                    for record, length in open_topoi:
+                        length.feed(piece)
+
+                if el.tag not in ('topos', 'connection', 'toporef'):
+                    continue
+
+                position = len(self.elements)
+                attrib = dict(el.attrib)
+
+                if el.tag == 'topos':
+                    record = Topos(position, attrib, el.sourceline, 0, 0, 0)
+                    open_topoi.append((record, TextLength()))
+                    self.topoi.append(record)
+
+                elif el.tag == 'connection':
+                    record = Connection(position, attrib, el.sourceline, parent.tag, dict(parent.attrib))
+                    self.connections.append(record)
+
+                else:
+                    containing_node = None
+                    if parent.tag == 'topos':
+                        containing_node = parent.attrib.get('framename')
+                    elif parent.tag == 'connection':
+                        grandparent = parent.getparent()
+                        if grandparent is not None:
+                            containing_node = grandparent.attrib.get('framename')
+                    # The text isn't complete until the toporef ends
+                    record = Toporef(position, attrib, el.sourceline, None, parent.tag, containing_node)
+                    self.toporefs.append(record)
+
+                    for topos, length in open_topoi:
+                        topos.toporefs.append(record)
+
+                self.elements.append(record)
+
+            else:
+                piece = el[-1].tail if len(el) > 0 else el.text
+                for record, length in open_topoi:
+                    length.feed(piece)
+
+                if el.tag == 'topos':
+                    record, length = open_topoi.pop()
+                    record.length = length.stripped()
+                    record.raw_length = length.raw
+                    record.lead_length = len(el.text or '')
+
+                elif el.tag == 'toporef':
+                    # Toporefs can't contain topoi, so the last toporef recorded is this one
+                    self.toporefs[-1].text = el.text
+
+                # Discard the element and any earlier siblings. Its tail is kept, as it is only counted once the next element starts or its parent ends.
+                el.clear(keep_tail=True)
+                parent = el.getparent()
+                if parent is not None:
+                    while el.getprevious() is not None:
+                        del parent[0]
@@ -407,4 +407,103 @@ print_style = {
             'symbol': 'files/symbology_greyscale/wilderness.svg'
         }
     ]
-}
\ No newline at end of file
+}
+
+class CompiledStyle():
+    """
+    A style dictionary (such as colour_style or print_style) turned into lookup tables, so that finding the style of an edge or node doesn't mean scanning every style in the dictionary.
+    Matching works as it always has: an edge or node takes the style whose label equals any of its attribute values, and where several match, the one that comes last in the style wins.
+    The style is checked when it is compiled, so a mistake in it is reported before anything is drawn. Compile a style once and pass it to draw_graph to reuse it for a batch of renders.
+    Other parts of the style can still be read as if it were the dictionary, e.g. style['background'].
+    """
+
+    edge_keys = ['stroke', 'stroke-width', 'stroke-dasharray', 'stroke-case', 'stroke-case-color']
+    node_keys = ['symbol']
+
+    def __init__(self, style):
+        """
+        style: a python dictionary defining the styles for nodes and edges
+        """
+        self.style = style
+        self.validate()
+
+        # Edge styles by label. A later style with the same label replaces an earlier one, as it would have when matching
+        self.edge_styles = {}
+        for index, edge_style in enumerate(style['edges']):
+            self.edge_styles[edge_style['label']] = (index, edge_style)
+        self.default_edge = self.edge_styles[None][1]
+
+        # Node styles by label. Every node style that matches draws its symbol, so keep them all
+        self.node_styles = {}
+        for index, node_style in enumerate(style['nodes']):
+            self.node_styles.setdefault(node_style['label'], []).append((index, node_style))
+
+    def __getitem__(self, key):
+        return self.style[key]
+
+    def get(self, key, default=None):
+        return self.style.get(key, default)
+
+    def validate(self):
+        """Raises a ValueError if the style is missing anything needed to draw a graph"""
+        for section, keys in [('background', ['color']), ('label', ['font-family', 'fill'])]:
+            if section not in self.style:
+                raise ValueError("Style has no '" + section + "' section")
+            for key in keys:
+                if key not in self.style[section]:
+                    raise ValueError("Style's '" + section + "' section has no '" + key + "'")
+
+        for section, keys in [('edges', self.edge_keys), ('nodes', self.node_keys)]:
+            if section not in self.style:
+                raise ValueError("Style has no '" + section + "' section")
+            for item in self.style[section]:
+                if 'label' not in item:
+                    raise ValueError("A style in '" + section + "' has no label")
+                for key in keys:
+                    if key not in item:
+                        raise ValueError("The '" + str(item['label']) + "' style in '" + section + "' has no '" + key + "'")
+
+        if not any(edge_style['label'] is None for edge_style in self.style['edges']):
+            raise ValueError("Style has no default edge style (an edge style with the label None)")
+
+    def edge_style(self, data):
+        """
+        Returns the style for an edge
+        data: the edge's attribute dictionary
+        """
+        match = None
+        for value in data.values():
+            try:
+                found = self.edge_styles.get(value)
+            except TypeError:
+                # Unhashable values, like lists, can't be labels
+                continue
+            if found is not None and (match is None or found[0] > match[0]):
+                match = found
+
+        if match is None:
+            return self.default_edge
+        return match[1]
+
+    def node_styles_for(self, data):
+        """
+        Returns the styles whose symbols should be drawn for a node, in the order they come in the style
+        data: the node's attribute dictionary
+        """
+        matches = []
+        for value in data.values():
+            try:
+                matches.extend(self.node_styles.get(value, []))
+            except TypeError:
+                continue
+
+        if len(matches) > 1:
+            matches.sort(key=lambda match: match[0])
+        return [node_style for index, node_style in matches]
+
+
+def compile_style(style):
+    """Returns style as a CompiledStyle, compiling it if it is still a dictionary"""
+    if isinstance(style, CompiledStyle):
+        return style
+    return CompiledStyle(style)
@@ -0,0 +1,339 @@
+# Python Core
+import io
+
+# 3rd Party
+import svgwrite
+
+
+class SvgElement():
+    """
+    An svg element that is written out as a string. Made by SvgWriter, with the same arguments as the svgwrite element of the same name.
+    """
+
+    def __init__(self, tag, attribs=None, text=None):
+        self.tag = tag
+        self.attribs = attribs if attribs is not None else {}
+        self.content = text
+        self.elements = []
+        self.commands = []
+
+    def __getitem__(self, key):
+        return self.attribs[key]
+
+    def __setitem__(self, key, value):
+        self.attribs[key] = value
+
+    def add(self, element):
+        """Adds a child element, returning it"""
+        self.elements.append(element)
+        return element
+
+    def push(self, *commands):
+        """Adds commands to a path's 'd' attribute"""
+        self.commands.extend(commands)
+
+    def viewbox(self, minx, miny, width, height):
+        self.attribs['viewBox'] = ','.join(str(value) for value in [minx, miny, width, height])
+
+    def get_id(self):
+        return self.attribs['id']
+
+    def start_tag(self, empty=False):
+        """The element's opening tag, with its attributes in the order svgwrite writes them"""
+        if len(self.commands) > 0:
+            self.attribs['d'] = ' '.join([self.attribs.get('d', '')] + self.commands).strip()
+            self.commands = []
+
+        parts = ['<', self.tag]
+        for attribute, value in sorted(self.attribs.items()):
+            if value is None:
+                continue
+            value = str(value)
+            if value:
+                parts.append(' ' + attribute + '="' + escape_attribute(value) + '"')
+        parts.append(' />' if empty else '>')
+        return ''.join(parts)
+
+    def end_tag(self):
+        return '</' + self.tag + '>'
+
+    def tostring(self):
+        if self.content is None and len(self.elements) == 0:
+            return self.start_tag(empty=True)
+
+        parts = [self.start_tag()]
+        if self.content is not None:
+            parts.append(escape_text(str(self.content)))
+        for element in self.elements:
+            parts.append(element.tostring())
+        parts.append(self.end_tag())
+        return ''.join(parts)
+
+
+class SvgWriter(SvgElement):
+    """
+    A fast stand-in for svgwrite.Drawing that builds the svg as strings, without svgwrite's element objects or checks.
+    It has the parts of svgwrite's interface that the graph renderers use, and writes the same elements and attributes in the same order as svgwrite does, so the two can be compared directly.
+    Use svgwrite (with its checks) when changing how graphs are drawn, and this for producing them.
+    """
+
+    def __init__(self, filename=None, size=('100%', '100%')):
+        """
+        filename: path to the svg file to write
+        size: the width and height of the svg
+        """
+        SvgElement.__init__(self, 'svg', {
+            'baseProfile': 'full',
+            'version': '1.1',
+            'width': size[0],
+            'height': size[1],
+            'xmlns': 'http://www.w3.org/2000/svg',
+            'xmlns:xlink': 'http://www.w3.org/1999/xlink',
+            'xmlns:ev': 'http://www.w3.org/2001/xml-events',
+        })
+        self.filename = filename
+        self.defs = SvgElement('defs')
+
+    ## Elements, made the same way as svgwrite's
+
+    def element(self, tag, extra, text=None):
+        attribs = {}
+        for key, value in extra.items():
+            attribs[key.rstrip('_').replace('_', '-')] = value
+        return SvgElement(tag, attribs, text)
+
+    def g(self, **extra):
+        return self.element('g', extra)
+
+    def rect(self, insert=(0, 0), size=(1, 1), **extra):
+        element = self.element('rect', extra)
+        element['x'], element['y'] = insert
+        element['width'], element['height'] = size
+        return element
+
+    def line(self, start=(0, 0), end=(0, 0), **extra):
+        element = self.element('line', extra)
+        element['x1'], element['y1'] = start
+        element['x2'], element['y2'] = end
+        return element
+
+    def path(self, d=None, **extra):
+        element = self.element('path', extra)
+        if d is not None:
+            element['d'] = d
+        return element
+
+    def polygon(self, points=(), **extra):
+        element = self.element('polygon', extra)
+        element['points'] = ' '.join(str(x) + ',' + str(y) for x, y in points)
+        return element
+
+    def circle(self, center=(0, 0), r=1, **extra):
+        element = self.element('circle', extra)
+        element['cx'], element['cy'] = center
+        element['r'] = r
+        return element
+
+    def image(self, href, insert=None, size=None, **extra):
+        element = self.element('image', extra)
+        element['xlink:href'] = href
+        if insert is not None:
+            element['x'], element['y'] = insert
+        if size is not None:
+            element['width'], element['height'] = size
+        return element
+
+    def text(self, text, insert=None, **extra):
+        element = self.element('text', extra, text=text)
+        if insert is not None:
+            element['x'], element['y'] = insert
+        return element
+
+    def symbol(self, **extra):
+        return self.element('symbol', extra)
+
+    def use(self, href, insert=None, size=None, **extra):
+        element = self.element('use', extra)
+        if isinstance(href, SvgElement):
+            href = '#' + href.get_id()
+        element['xlink:href'] = href
+        if insert is not None:
+            element['x'], element['y'] = insert
+        if size is not None:
+            element['width'], element['height'] = size
+        return element
+
+    ## Output
+
+    def chunks(self):
+        """The svg, without its xml declaration, as a series of strings"""
+        yield self.start_tag()
+        yield self.defs.tostring()
+        for element in self.elements:
+            yield element.tostring()
+        yield self.end_tag()
+
+    def tostring(self):
+        return ''.join(self.chunks())
+
+    def write(self, fileobj):
+        """Writes the svg to a file-like object"""
+        fileobj.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        for chunk in self.chunks():
+            fileobj.write(chunk)
+
+    def save(self):
+        with io.open(self.filename, mode='w', encoding='utf-8') as fileobj:
+            self.write(fileobj)
+
+
+class SvgStream(SvgWriter):
+    """
+    An SvgWriter that hands over the svg as it is drawn, rather than holding all of it until it is saved.
+    Elements are turned into text as soon as they are added to the drawing or to one of its groups, and flush() takes the text written since it was last called, so the whole drawing is never in memory at once.
+    Groups should be added to the drawing before anything is added to them, as the renderers do. A symbol added to the <defs> once drawing has started is written where it is added, inside a <defs> of its own.
+    """
+
+    def __init__(self, size=('100%', '100%')):
+        """
+        size: the width and height of the svg
+        """
+        SvgWriter.__init__(self, size=size)
+        self.defs = StreamGroup(self, 'defs')
+        self.pending = ['<?xml version="1.0" encoding="utf-8" ?>\n']
+        self.pending_length = 0
+        self.started = False
+        self.open_group = None
+
+    def g(self, **extra):
+        element = self.element('g', extra)
+        return StreamGroup(self, 'g', element.attribs)
+
+    def write_text(self, text):
+        self.pending.append(text)
+        self.pending_length += len(text)
+
+    def start(self):
+        if not self.started:
+            self.write_text(self.start_tag())
+            self.write_text(self.defs.tostring())
+            self.started = True
+            self.defs.open = True
+
+    def close_group(self):
+        if self.open_group is not None:
+            self.write_text(self.open_group.end_tag())
+            self.open_group.open = False
+            self.open_group = None
+
+    def add(self, element):
+        """Writes an element, or opens a group so that what is added to it is written inside it"""
+        self.start()
+        self.close_group()
+
+        if isinstance(element, StreamGroup):
+            self.write_text(element.start_tag())
+            for child in element.elements:
+                self.write_text(child.tostring())
+            element.elements = []
+            element.open = True
+            self.open_group = element
+        else:
+            self.write_text(element.tostring())
+        return element
+
+    def flush(self, minimum=0):
+        """
+        Returns the svg written since the last flush, or an empty string if there is less than minimum characters of it
+        minimum: how much to wait for, so that the svg comes out in reasonably sized chunks
+        """
+        if self.pending_length < minimum or len(self.pending) == 0:
+            return ''
+        text = ''.join(self.pending)
+        self.pending = []
+        self.pending_length = 0
+        return text
+
+    def close(self):
+        """Finishes the svg, returning the last of it"""
+        self.start()
+        self.close_group()
+        self.write_text(self.end_tag())
+        return self.flush()
+
+
+class StreamGroup(SvgElement):
+    """A group (or <defs>) in an SvgStream, which writes what is added to it straight away once it is open"""
+
+    def __init__(self, stream, tag, attribs=None):
+        SvgElement.__init__(self, tag, attribs)
+        self.stream = stream
+        self.open = False
+
+    def add(self, element):
+        if not self.open:
+            self.elements.append(element)
+        elif self.tag == 'defs':
+            self.stream.write_text('<defs>' + element.tostring() + '</defs>')
+        else:
+            self.stream.write_text(element.tostring())
+        return element
+
+
+def write_chunks(output, chunks):
+    """
+    Writes chunks of text to output as they come
+    output: a path, or a file-like object opened for writing text
+    """
+    if hasattr(output, 'write'):
+        for chunk in chunks:
+            output.write(chunk)
+    else:
+        with io.open(output, mode='w', encoding='utf-8') as fileobj:
+            for chunk in chunks:
+                fileobj.write(chunk)
+
+
+def escape_attribute(value):
+    """Escapes an attribute value the way ElementTree (and so svgwrite) does"""
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    if '"' in value:
+        value = value.replace('"', '&quot;')
+    if '\r' in value:
+        value = value.replace('\r', '&#13;')
+    if '\n' in value:
+        value = value.replace('\n', '&#10;')
+    if '\t' in value:
+        value = value.replace('\t', '&#09;')
+    return value
+
+
+def escape_text(text):
+    """Escapes text content the way ElementTree (and so svgwrite) does"""
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def new_drawing(filename, size, backend='svgwrite'):
+    """
+    Starts a drawing for one of the graph renderers to draw on
+    filename: path to the svg file to write
+    size: the width and height of the svg
+    backend: 'svgwrite' to check every element and attribute as it is drawn, which is slow but catches mistakes when changing how graphs are drawn, or 'raw' to write the svg directly, which is several times faster
+    """
+    if backend == 'svgwrite':
+        return svgwrite.Drawing(filename=filename, size=size, profile='full', debug=True)
+    elif backend == 'raw':
+        return SvgWriter(filename=filename, size=size)
+    else:
+        raise ValueError("Unknown svg backend '" + str(backend) + "', expected 'svgwrite' or 'raw'")
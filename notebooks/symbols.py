@@ -0,0 +1,121 @@
+# Python Core
+import base64
+import os
+import re
+
+# 3rd Party
+from wand.image import Image
+
+
+class SymbolCache():
+    """
+    Reads and base64-encodes the symbol files used to draw nodes, once per file rather than once per node.
+    Entries are keyed by path and modification time, so a symbol that is edited while a notebook is running is read again.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def data_uri(self, path):
+        """
+        Returns the contents of a symbol file as a data URI that can be used as the href of an image
+        path: path to an svg (or png) file
+        """
+        mtime = os.path.getmtime(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        with open(path, 'rb') as file:
+            encoded = base64.b64encode(file.read()).decode()
+
+        if path.lower().endswith('.png'):
+            uri = 'data:image/png;base64,{}'.format(encoded)
+        else:
+            uri = 'data:image/svg+xml;base64,{}'.format(encoded)
+
+        self.entries[path] = (mtime, uri)
+        return uri
+
+    def symbol_id(self, path):
+        """A stable id for a symbol file, made from its file name, for use in <symbol> and <use> elements"""
+        name = os.path.splitext(os.path.basename(path))[0]
+        return 'symbol-' + re.sub(r'[^A-Za-z0-9_-]', '-', name)
+
+    def clear(self):
+        self.entries = {}
+
+
+class SymbolDefinitions():
+    """
+    Adds each symbol to a drawing once, as a <symbol> in its <defs>, and draws nodes with <use> elements that refer to it.
+    This keeps the encoded symbol out of every node, which makes large graphs much smaller.
+    """
+
+    def __init__(self, dwg, cache=None):
+        """
+        dwg: an svgwrite Drawing
+        cache: a SymbolCache, by default the one shared by the whole process
+        """
+        self.dwg = dwg
+        self.cache = cache if cache is not None else symbol_cache
+        self.symbols = {}
+
+    def symbol(self, path):
+        """Returns the <symbol> for a symbol file, adding it to the drawing's <defs> the first time it is used"""
+        symbol = self.symbols.get(path)
+        if symbol is None:
+            symbol = self.dwg.symbol(id=self.cache.symbol_id(path))
+            symbol.viewbox(0, 0, 1, 1)
+            symbol.add(self.dwg.image(href=self.cache.data_uri(path), insert=(0, 0), size=(1, 1)))
+            self.dwg.defs.add(symbol)
+            self.symbols[path] = symbol
+        return symbol
+
+    def use(self, path, insert, size):
+        """Returns a <use> element that draws a symbol file at insert, scaled to size"""
+        return self.dwg.use(self.symbol(path), insert=insert, size=size)
+
+
+class BackgroundCache():
+    """
+    Converts background images to PNG data URIs with ImageMagick once, rather than on every render, so batches of graphs drawn over the same map only convert it once.
+    Entries are keyed by path and modification time, like SymbolCache. The image is embedded at its own resolution whatever the size of the drawing, so that isn't part of the key.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def data_uri(self, path):
+        """
+        Returns an image as a PNG data URI that can be used as the href of an image
+        path: path to an image in any format ImageMagick can read
+        """
+        mtime = os.path.getmtime(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        with Image(filename=path) as img:
+            encoded = base64.b64encode(img.make_blob(format='png')).decode()
+        uri = 'data:image/png;base64,{}'.format(encoded)
+
+        self.entries[path] = (mtime, uri)
+        return uri
+
+    def link(self, path, relative_to=None):
+        """
+        Returns an href that links to an image rather than embedding it, which keeps the svg small. The image must then be kept alongside the svg, in a format that whatever displays the svg can read (PNG, JPEG or SVG).
+        path: path to the image
+        relative_to: the folder the svg will be saved in, to make the link relative to, or None to use path as it is
+        """
+        if relative_to is not None:
+            path = os.path.relpath(os.path.abspath(path), os.path.abspath(relative_to))
+        return path.replace(os.sep, '/')
+
+    def clear(self):
+        self.entries = {}
+
+
+symbol_cache = SymbolCache()
+background_cache = BackgroundCache()
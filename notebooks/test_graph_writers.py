@@ -0,0 +1,54 @@
+# Checks that graph_writers' GEXF and GraphML files read back through networkx as the same graphs as networkx's own writers' files do
+
+# 3rd Party
+import networkx as nx
+import pytest
+
+# This library
+import graph_writers
+
+
+def example_graph(graph_type=nx.MultiDiGraph):
+    """A graph with the attributes graph_generators gives its graphs, parallel edges, and names that need escaping"""
+    graph = graph_type()
+    graph.add_node('Mr "Crusoe"', chronotope='idyll', length=12, node_type='topos', timeframes='1 2', x=10.5, y=-3.0)
+    graph.add_node('Bread & Butter', chronotope='road', length=3, node_type='topos', timeframes='2', x=0.25, y=7.0)
+    graph.add_node('<island>', chronotope='wilderness', length=40, node_type='topos', timeframes='', x=-1.0, y=2.5)
+    graph.add_node('reader', node_type='character')
+    graph.add_edge('Mr "Crusoe"', 'Bread & Butter', relation='direct', length=5, timeframes='1')
+    graph.add_edge('Mr "Crusoe"', 'Bread & Butter', relation='jump', length=2, timeframes='2')
+    graph.add_edge('Bread & Butter', '<island>', relation='indirect', length=1, weight=2, timeframes='2')
+    graph.add_edge('<island>', 'Mr "Crusoe"', relation='interrupt', length=7, timeframes='1 2')
+    graph.add_edge('reader', '<island>', relation='charshift')
+    return graph
+
+
+def read_back(read, path):
+    graph = read(str(path))
+    edges = graph.edges(keys=True, data=True) if graph.is_multigraph() else graph.edges(data=True)
+    return sorted(graph.nodes(data=True)), sorted(edges, key=repr), type(graph)
+
+
+@pytest.mark.parametrize('graph_type', [nx.MultiDiGraph, nx.DiGraph])
+@pytest.mark.parametrize('extension', ['', '.gz'])
+@pytest.mark.parametrize('write, write_nx, read', [
+    (graph_writers.write_gexf, nx.write_gexf, nx.read_gexf),
+    (graph_writers.write_graphml, nx.write_graphml, nx.read_graphml)
+])
+def test_round_trip(tmp_path, graph_type, extension, write, write_nx, read):
+    graph = example_graph(graph_type)
+    ours = tmp_path / ('ours' + extension)
+    theirs = tmp_path / ('theirs' + extension)
+    write(graph, str(ours))
+    write_nx(graph, str(theirs))
+    assert read_back(read, ours) == read_back(read, theirs)
+
+
+@pytest.mark.parametrize('write, read', [(graph_writers.write_gexf, nx.read_gexf), (graph_writers.write_graphml, nx.read_graphml)])
+def test_compressed(tmp_path, write, read):
+    graph = example_graph()
+    write(graph, str(tmp_path / 'graph'))
+    write(graph, str(tmp_path / 'graph.gz'))
+    with open(tmp_path / 'graph.gz', 'rb') as file:
+        assert file.read(2) == b'\x1f\x8b'
+    assert read_back(read, tmp_path / 'graph.gz') == read_back(read, tmp_path / 'graph')